@@ -0,0 +1,317 @@
+"""Hot/cold tiering for messages.
+
+Messages older than ARCHIVE_AFTER_DAYS are moved, in small batches, from
+``messages`` into per-month tables (``messages_archive_YYYYMM``). Those
+keep the ids, participants and timestamp as indexed columns and the rest
+of the row as one zlib-compressed JSON payload.
+
+Messages are always moved oldest first in (timestamp, id) order, so the
+archive holds a prefix of the history and every hot row sorts after every
+archived one. Read paths therefore only concatenate pages: newest-first
+pages fall through to the archive once the hot rows run out, and
+oldest-first pages read the archive before the hot table.
+
+Archiving counts as reading: unread messages are stored as read and
+their conversations' unread counters are lowered in the same transaction.
+Archived rows are read-only and leave the search index, so /search only
+finds hot messages. Run ``python archive.py --days N`` to archive on demand.
+
+Each partition records which users sent or received its rows, so read
+paths only visit a user's own partitions, and users with nothing archived
+never touch the archive. Read paths plan from the partition list and those
+records, cached for ARCHIVE_PARTITIONS_TTL and reloaded whenever this
+process archives, so batches moved by another process show up within that
+TTL.
+"""
+import asyncio
+import json
+import logging
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, takewhile
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, Table, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import config
+from conversations import lower_unread
+from database import AsyncSessionLocal
+from models import ArchivePartition, ArchivePartitionUser, Message
+from utils.cache import LRUCache
+from utils.pagination import decode_cursor, keyset_filter
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Same field names as the message columns read paths select, plus nothing
+# else, so a page can mix hot rows and archived ones
+ArchivedMessage = namedtuple("ArchivedMessage", [
+    "id", "sender_id", "receiver_id", "content", "timestamp",
+    "is_fraudulent", "fraud_probability", "fraud_status", "conversation_id", "read",
+])
+
+_PAYLOAD_FIELDS = ("content", "is_fraudulent", "fraud_probability", "fraud_status", "read")
+
+_metadata = MetaData()
+
+
+def partition_table(month: str) -> Table:
+    """The archive table for ``month`` ("YYYY-MM")."""
+    name = f"messages_archive_{month.replace('-', '')}"
+    table = _metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _metadata,
+            Column("id", Integer, primary_key=True, autoincrement=False),
+            Column("sender_id", Integer, nullable=False),
+            Column("receiver_id", Integer, nullable=False),
+            Column("conversation_id", Integer),
+            Column("timestamp", DateTime, nullable=False),
+            Column("payload", LargeBinary, nullable=False),
+            # Same keyset orders as the hot table's indexes
+            Index(f"ix_{name}_receiver", "receiver_id", "timestamp", "id"),
+            Index(f"ix_{name}_sender", "sender_id", "timestamp", "id"),
+            Index(f"ix_{name}_conversation", "conversation_id", "timestamp", "id"),
+        )
+    return table
+
+
+def _compress(row) -> bytes:
+    payload = {field: getattr(row, field) for field in _PAYLOAD_FIELDS}
+    # Unread counters are lowered when a message is archived
+    payload["read"] = True
+    return zlib.compress(dumps(payload), config.ARCHIVE_COMPRESSION_LEVEL)
+
+
+def _decode(row) -> ArchivedMessage:
+    payload = json.loads(zlib.decompress(row.payload))
+    return ArchivedMessage(
+        id=row.id, sender_id=row.sender_id, receiver_id=row.receiver_id, timestamp=row.timestamp,
+        conversation_id=row.conversation_id, **payload
+    )
+
+
+def _select(table: Table):
+    return select(
+        table.c.id, table.c.sender_id, table.c.receiver_id, table.c.conversation_id, table.c.timestamp, table.c.payload
+    )
+
+
+# Partition list, newest month last; refreshed every ARCHIVE_PARTITIONS_TTL
+# and right after this process archives a batch
+_partitions = {"loaded_at": 0.0, "rows": []}
+# user_id -> months holding their rows, same TTL
+_user_months = LRUCache(maxsize=config.ARCHIVE_USER_CACHE_SIZE, ttl=config.ARCHIVE_PARTITIONS_TTL)
+
+
+async def partitions(db: AsyncSession) -> list:
+    if time.monotonic() - _partitions["loaded_at"] > config.ARCHIVE_PARTITIONS_TTL:
+        rows = (await db.execute(
+            select(ArchivePartition.month, ArchivePartition.oldest_at, ArchivePartition.newest_at)
+            .where(ArchivePartition.row_count > 0)
+            .order_by(ArchivePartition.month)
+        )).all()
+        _partitions.update(loaded_at=time.monotonic(), rows=rows)
+    return _partitions["rows"]
+
+
+async def user_partitions(db: AsyncSession, user_id: int) -> list:
+    """The partitions holding messages ``user_id`` sent or received, newest month last."""
+    rows = await partitions(db)
+    if not rows:
+        return []
+    months = _user_months.get(user_id)
+    if months is None:
+        months = frozenset(await db.scalars(
+            select(ArchivePartitionUser.month).where(ArchivePartitionUser.user_id == user_id)
+        ))
+        _user_months.set(user_id, months)
+    return [p for p in rows if p.month in months]
+
+
+async def fetch_page(db: AsyncSession, user_id: int, owner, limit: int, before=None, after=None, since=None) -> list:
+    """Archived messages matching ``owner(table)``, paged like the hot table.
+
+    ``owner`` must only match rows ``user_id`` sent or received. Same cursor
+    semantics as ``keyset_filter``; raises ValueError on a bad cursor.
+    Partitions that cannot hold rows past the cursor are skipped.
+    """
+    descending = after is None and since is None
+    months = await user_partitions(db, user_id)
+    if descending:
+        bound = decode_cursor(before)[0] if before is not None else None
+        months = [p for p in reversed(months) if bound is None or p.oldest_at <= bound]
+    else:
+        bound = decode_cursor(after)[0] if after is not None else since
+        if bound.tzinfo is not None:
+            bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+        # Polling clients ask for rows newer than anything archived
+        months = [p for p in months if p.newest_at >= bound]
+
+    result = []
+    for partition in months:
+        table = partition_table(partition.month)
+        query = keyset_filter(
+            _select(table).where(owner(table)), table.c.timestamp, table.c.id, before=before, after=after, since=since
+        )
+        result += [_decode(row) for row in await db.execute(query.limit(limit - len(result)))]
+        if len(result) >= limit:
+            break
+    return result
+
+
+async def fetch_by_ids(db: AsyncSession, messages) -> dict:
+    """Archived messages by id, from (message_id, timestamp) pairs."""
+    result = {}
+    known = {p.month for p in await partitions(db)}
+    by_month = {}
+    for message_id, timestamp in messages:
+        if message_id is not None and timestamp is not None:
+            by_month.setdefault(timestamp.strftime("%Y-%m"), []).append(message_id)
+    for month, ids in by_month.items():
+        if month in known:
+            table = partition_table(month)
+            for row in await db.execute(_select(table).where(table.c.id.in_(ids))):
+                result[row.id] = _decode(row)
+    return result
+
+
+async def stream_batches(db: AsyncSession, user_id: int, owner):
+    """Yield lists of ``user_id``'s archived messages matching ``owner(table)``, oldest first."""
+    for partition in await user_partitions(db, user_id):
+        table = partition_table(partition.month)
+        rows = await db.stream(
+            _select(table).where(owner(table))
+            .order_by(table.c.timestamp.asc(), table.c.id.asc())
+            .execution_options(yield_per=config.EXPORT_BATCH_SIZE)
+        )
+        async for batch in rows.partitions():
+            yield [_decode(row) for row in batch]
+
+
+class ArchiveWorker:
+    """Moves old messages into the archive, one short transaction per batch."""
+
+    def __init__(self, after_days, batch_size=500, pause=0.1, interval=300.0):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.archived_total = 0
+        self.failed_batches = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await self.archive_once()
+            except Exception as e:
+                self.failed_batches += 1
+                logger.error("Archive batch failed: %s", e)
+                moved = 0
+            # Yield the write lock between batches; idle once caught up
+            await asyncio.sleep(self.pause if moved == self.batch_size else self.interval)
+
+    async def archive_once(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    Message.id, Message.sender_id, Message.receiver_id, Message.conversation_id, Message.timestamp,
+                    *(getattr(Message, field) for field in _PAYLOAD_FIELDS)
+                )
+                .where(Message.timestamp < cutoff)
+                .order_by(Message.timestamp, Message.id)
+                .limit(self.batch_size)
+            )).all()
+            # Stop at a message still waiting for fraud scoring so the
+            # archive stays a prefix of the history
+            rows = list(takewhile(lambda row: row.fraud_status != "pending", rows))
+            if not rows:
+                return 0
+
+            conn = await db.connection()
+            users = set()
+            for month, group in groupby(rows, key=lambda row: row.timestamp.strftime("%Y-%m")):
+                group = list(group)
+                table = partition_table(month)
+                await conn.run_sync(table.create, checkfirst=True)
+                await db.execute(insert(table), [
+                    {
+                        "id": row.id, "sender_id": row.sender_id, "receiver_id": row.receiver_id,
+                        "conversation_id": row.conversation_id, "timestamp": row.timestamp, "payload": _compress(row),
+                    }
+                    for row in group
+                ])
+                partition = await db.get(ArchivePartition, month)
+                if partition is None:
+                    partition = ArchivePartition(month=month, table_name=table.name, row_count=0, oldest_at=group[0].timestamp)
+                    db.add(partition)
+                partition.row_count += len(group)
+                partition.newest_at = group[-1].timestamp
+                members = {user_id for row in group for user_id in (row.sender_id, row.receiver_id)}
+                members -= set(await db.scalars(select(ArchivePartitionUser.user_id).where(
+                    ArchivePartitionUser.month == month, ArchivePartitionUser.user_id.in_(members)
+                )))
+                if members:
+                    await db.execute(insert(ArchivePartitionUser), [
+                        {"user_id": user_id, "month": month} for user_id in members
+                    ])
+                users |= members
+            await lower_unread(db, [
+                (row.conversation_id, row.sender_id, row.receiver_id) for row in rows if not row.read
+            ])
+            await db.execute(
+                delete(Message).where(Message.id.in_([row.id for row in rows])),
+                execution_options={"synchronize_session": False}
+            )
+            await db.commit()
+
+        self.archived_total += len(rows)
+        _partitions["loaded_at"] = 0.0
+        for user_id in users:
+            _user_months.pop(user_id)
+        logger.info("Archived %s messages up to %s", len(rows), rows[-1].timestamp)
+        return len(rows)
+
+
+archive_worker = ArchiveWorker(
+    after_days=config.ARCHIVE_AFTER_DAYS,
+    batch_size=config.ARCHIVE_BATCH_SIZE,
+    pause=config.ARCHIVE_BATCH_PAUSE,
+    interval=config.ARCHIVE_INTERVAL,
+)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move old messages into the monthly archive tables")
+    parser.add_argument("--days", type=int, default=config.ARCHIVE_AFTER_DAYS or 365,
+                        help="archive messages older than this many days")
+    args = parser.parse_args()
+
+    async def main():
+        from migrations import init_db
+        from database import engine
+        await init_db()
+        worker = ArchiveWorker(after_days=args.days, batch_size=config.ARCHIVE_BATCH_SIZE)
+        while await worker.archive_once():
+            await asyncio.sleep(config.ARCHIVE_BATCH_PAUSE)
+        await engine.dispose()
+        return worker.archived_total
+
+    print(f"Archived {asyncio.run(main())} messages.")
@@ -1,8 +1,8 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jwt import PyJWTError, decode
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from jwt import InvalidTokenError, PyJWTError, decode
+from utils.cache import LRUCache
+import config
 import logging
 
 # Configure logging
@@ -11,29 +11,32 @@ logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Verified token -> user_id, each entry dropped at the token's own exp
+_token_cache = LRUCache(maxsize=config.TOKEN_CACHE_SIZE)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        if not token:
-            logger.error("No token provided in Authorization header")
-            raise HTTPException(status_code=401, detail="Token não fornecido")
-        logger.info(f"Decoding token: {token[:10]}...")  # Log partial token for debugging
-        payload = decode(token, "secret_key", algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            logger.error("Token missing user_id")
-            raise HTTPException(status_code=401, detail="Token inválido: user_id ausente")
-        logger.info(f"Token valid, user_id: {user_id}")
+def verify_token(token: str) -> int:
+    """Return the user_id of a valid token; raise PyJWTError otherwise."""
+    user_id = _token_cache.get(token)
+    if user_id is not None:
         return user_id
+    payload = decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise InvalidTokenError("user_id ausente")
+    if payload.get("exp") is not None:
+        _token_cache.set(token, user_id, expires_at=payload["exp"])
+    return user_id
+
+def token_cache_stats():
+    return _token_cache.stats()
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> int:
+    try:
+        return verify_token(token)
     except PyJWTError as e:
-        logger.error(f"JWT decode error: {str(e)}")
-        raise HTTPException(status_code=401, detail=f"Erro ao validar token: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error in get_current_user: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
\ No newline at end of file
+        logger.warning("JWT validation failed: %s", e)
+        raise HTTPException(
+            status_code=401,
+            detail=f"Erro ao validar token: {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
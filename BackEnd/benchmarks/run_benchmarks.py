@@ -0,0 +1,261 @@
+"""Fraud scoring and messaging benchmarks.
+
+Replays sms_spam.csv and synthetic URL-laden messages through clean_text,
+detect_fraud (one by one, concurrently and batched) and the HTTP
+send -> inbox flow against a throw-away SQLite database. Results are
+written as JSON and compared with a stored baseline; the run exits with
+status 1 when a case got slower than the allowed tolerance.
+
+    cd BackEnd
+    python benchmarks/run_benchmarks.py --save-baseline     # record a baseline
+    python benchmarks/run_benchmarks.py                     # compare against it
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+# Settings are read at import time, so point the app at a scratch database first
+_tmpdir = tempfile.mkdtemp(prefix="bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault("FRAUD_WARM_UP", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("APP_ENV", "test")
+os.chdir(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import fraud_detection  # noqa: E402
+from fraud_detection import FraudDetectionRequest, clean_text, detect_fraud, detect_fraud_many, warm_up  # noqa: E402
+
+SUSPICIOUS_DOMAINS = ["secure-login", "verify-account", "bank", "paypa1", "promo", "delivery"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(latencies, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def load_messages(limit, seed=42):
+    texts = pd.read_csv("sms_spam.csv", encoding="latin-1")["v2"].dropna().tolist()
+    rng = random.Random(seed)
+    rng.shuffle(texts)
+    return texts[:limit]
+
+
+def synthetic_url_messages(texts, seed=7):
+    rng = random.Random(seed)
+    messages = []
+    for text in texts:
+        links = " ".join(
+            f"http{'s' if rng.random() < 0.5 else ''}://{rng.choice(SUSPICIOUS_DOMAINS)}{rng.randint(1, 999)}"
+            f".example.com/{rng.choice(['login', 'track', 'offer', 'id'])}?u={rng.randint(1, 10 ** 6)}"
+            for _ in range(rng.randint(1, 4))
+        )
+        messages.append(f"{text} {links}")
+    return messages
+
+
+def reset_caches():
+    """Measure model work, not the result caches."""
+    fraud_detection._result_cache.clear()
+    fraud_detection._url_cache.clear()
+
+
+def bench_clean_text(texts):
+    latencies = []
+    started = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        clean_text(text)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def bench_detect_sequential(texts):
+    reset_caches()
+    latencies = []
+    started = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        await detect_fraud(FraudDetectionRequest(content=text))
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def bench_detect_concurrent(texts, concurrency=64):
+    reset_caches()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await detect_fraud(FraudDetectionRequest(content=text))
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in texts))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def bench_detect_batched(texts, batch_size=64):
+    reset_caches()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        t0 = time.perf_counter()
+        await detect_fraud_many(batch)
+        # Report per-message latency so cases stay comparable
+        latencies.extend([(time.perf_counter() - t0) / len(batch)] * len(batch))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def bench_http_flow(texts, concurrency=16, users=8):
+    import httpx
+    import main
+
+    send_latencies, inbox_latencies = [], []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            headers, phones = [], []
+            for i in range(users):
+                phone = f"+2588400{i:05d}"
+                await client.post("/api/users/register", json={"username": f"bench{i}", "phone": phone, "password": "bench-pass"})
+                response = await client.post("/api/users/login", json={"phone": phone, "password": "bench-pass"})
+                headers.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+                phones.append(phone)
+
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(i, text):
+                async with semaphore:
+                    t0 = time.perf_counter()
+                    response = await client.post(
+                        "/api/messages/send",
+                        json={"receiver_phone": phones[(i + 1) % users], "content": text},
+                        headers=headers[i % users],
+                    )
+                    send_latencies.append(time.perf_counter() - t0)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(i, text) for i, text in enumerate(texts)))
+            send_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for i in range(len(texts) // 10 or 1):
+                t0 = time.perf_counter()
+                response = await client.get("/api/messages/inbox", headers=headers[i % users])
+                inbox_latencies.append(time.perf_counter() - t0)
+                response.raise_for_status()
+            inbox_elapsed = time.perf_counter() - started
+    return summarize(send_latencies, send_elapsed), summarize(inbox_latencies, inbox_elapsed)
+
+
+async def run(args):
+    texts = load_messages(args.messages)
+    url_texts = synthetic_url_messages(texts[: max(1, args.messages // 4)])
+    warm_up()
+
+    results = {}
+    results["clean_text"] = bench_clean_text(texts)
+    results["detect_fraud_sequential"] = await bench_detect_sequential(texts)
+    results["detect_fraud_concurrent"] = await bench_detect_concurrent(texts)
+    results["detect_fraud_batched"] = await bench_detect_batched(texts)
+    results["detect_fraud_urls_batched"] = await bench_detect_batched(url_texts)
+    if not args.skip_http:
+        reset_caches()
+        send, inbox = await bench_http_flow(texts[: args.http_messages])
+        results["http_send"] = send
+        results["http_inbox"] = inbox
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_version": fraud_detection.registry.version,
+            "messages": args.messages,
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions against the baseline."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results["results"].get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.3f}ms > baseline {base['p95_ms']:.3f}ms")
+        if current["throughput_per_s"] < base["throughput_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput_per_s']:.1f}/s < baseline {base['throughput_per_s']:.1f}/s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages replayed from sms_spam.csv")
+    parser.add_argument("--http-messages", type=int, default=500, help="messages sent through the HTTP flow")
+    parser.add_argument("--skip-http", action="store_true", help="only benchmark fraud scoring")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
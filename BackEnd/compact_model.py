@@ -0,0 +1,52 @@
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+
+class CompactTextModel:
+    """Hashed bag-of-words + logistic regression, stored as flat arrays in an .npz.
+
+    There is no vocabulary to load and no trees to walk: scoring is one
+    sparse-matrix/vector product, and the file holds only non-zero weights.
+    ``predict_proba`` matches the scikit-learn interface used by the scorer.
+    """
+
+    def __init__(self, weights, intercept, n_features, ngram_max=2):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.intercept = float(intercept)
+        self.n_features = int(n_features)
+        self.ngram_max = int(ngram_max)
+        self.vectorizer = self.make_vectorizer(self.n_features, self.ngram_max)
+
+    @staticmethod
+    def make_vectorizer(n_features=2 ** 18, ngram_max=2):
+        return HashingVectorizer(n_features=n_features, ngram_range=(1, ngram_max), alternate_sign=False, norm="l2")
+
+    @classmethod
+    def from_classifier(cls, clf, n_features, ngram_max=2):
+        """Wrap a fitted binary linear classifier (e.g. LogisticRegression)."""
+        return cls(clf.coef_.ravel(), clf.intercept_[0], n_features, ngram_max)
+
+    def decision_function(self, texts):
+        return self.vectorizer.transform(texts) @ self.weights + self.intercept
+
+    def predict_proba(self, texts):
+        prob = 1.0 / (1.0 + np.exp(-self.decision_function(texts)))
+        return np.column_stack([1.0 - prob, prob])
+
+    def save(self, path):
+        nonzero = np.flatnonzero(self.weights).astype(np.int32)
+        np.savez_compressed(
+            path,
+            indices=nonzero,
+            values=self.weights[nonzero],
+            intercept=np.float64(self.intercept),
+            n_features=np.int64(self.n_features),
+            ngram_max=np.int64(self.ngram_max),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            weights = np.zeros(int(data["n_features"]), dtype=np.float32)
+            weights[data["indices"]] = data["values"]
+            return cls(weights, data["intercept"], data["n_features"], data["ngram_max"])
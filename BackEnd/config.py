@@ -0,0 +1,119 @@
+import os
+from dotenv import load_dotenv
+
+# Load settings from a local .env file when present
+load_dotenv()
+
+# Fraud scoring engine
+FRAUD_MAX_BATCH_SIZE = int(os.getenv("FRAUD_MAX_BATCH_SIZE", "32"))
+# Largest list accepted by /api/detect_fraud/batch; every item shares the
+# scoring queue with /send, so one request must not flood it
+FRAUD_BATCH_MAX_CONTENTS = int(os.getenv("FRAUD_BATCH_MAX_CONTENTS", "64"))
+FRAUD_MAX_WAIT_MS = float(os.getenv("FRAUD_MAX_WAIT_MS", "2"))
+FRAUD_WORKERS = int(os.getenv("FRAUD_WORKERS", "2"))
+
+# Largest recipient list accepted by /api/messages/send_bulk
+BULK_SEND_MAX_RECIPIENTS = int(os.getenv("BULK_SEND_MAX_RECIPIENTS", "1000"))
+# Rows fetched (and NDJSON lines flushed) per round trip by /api/messages/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# Token-bucket rate limits: sends per user, login/register per client IP.
+# Bulk sends have their own per-user bucket, one token per recipient.
+# Buckets shrink by (1 - EWMA of the sender's fraud_probability), never
+# below MIN_FACTOR.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+SEND_RATE_PER_MINUTE = float(os.getenv("SEND_RATE_PER_MINUTE", "60"))
+SEND_BURST = float(os.getenv("SEND_BURST", "20"))
+BULK_RATE_PER_MINUTE = float(os.getenv("BULK_RATE_PER_MINUTE", "2000"))
+BULK_BURST = float(os.getenv("BULK_BURST", "1000"))
+# Texts scored per user through /api/detect_fraud and /api/detect_fraud/batch,
+# which share the scoring queue with /send
+FRAUD_API_RATE_PER_MINUTE = float(os.getenv("FRAUD_API_RATE_PER_MINUTE", "120"))
+FRAUD_API_BURST = float(os.getenv("FRAUD_API_BURST", "64"))
+AUTH_RATE_PER_MINUTE = float(os.getenv("AUTH_RATE_PER_MINUTE", "10"))
+AUTH_BURST = float(os.getenv("AUTH_BURST", "5"))
+# Login/register limits key on the client address. Behind a proxy or load
+# balancer either start uvicorn with --forwarded-allow-ips=<proxy address>
+# or name the header the proxy sets (e.g. X-Forwarded-For, X-Real-IP); the
+# last address in it is used, so only set this when every request passes
+# through a proxy that writes it
+CLIENT_IP_HEADER = os.getenv("CLIENT_IP_HEADER", "")
+FRAUD_THROTTLE_ALPHA = float(os.getenv("FRAUD_THROTTLE_ALPHA", "0.3"))
+FRAUD_THROTTLE_MIN_FACTOR = float(os.getenv("FRAUD_THROTTLE_MIN_FACTOR", "0.1"))
+FRAUD_THROTTLE_TTL = float(os.getenv("FRAUD_THROTTLE_TTL", "3600"))
+
+# Archival: messages older than ARCHIVE_AFTER_DAYS move to compressed
+# per-month tables in batches (0 disables the background mover)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.1"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "300"))
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))
+ARCHIVE_PARTITIONS_TTL = float(os.getenv("ARCHIVE_PARTITIONS_TTL", "60"))
+ARCHIVE_USER_CACHE_SIZE = int(os.getenv("ARCHIVE_USER_CACHE_SIZE", "100000"))
+
+# Real-time delivery
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./chat_app1.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Authentication. SECRET_KEY signs the JWTs; the API refuses to start
+# without it outside APP_ENV=dev/test, where a random per-process key is
+# used instead, so tokens stop working on restart. Offline tools (dw.py,
+# training, migrations, archive) never need it
+APP_ENV = os.getenv("APP_ENV", "production")
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY and APP_ENV in ("dev", "test"):
+    import secrets
+    SECRET_KEY = secrets.token_urlsafe(32)
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", str(24 * 60)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# User directory cache (id/phone/username -> user); the TTL bounds
+# staleness for changes made by other worker processes
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "100000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "100000"))
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
+
+# Fraud models and result caches
+TEXT_MODEL_PATH = os.getenv("TEXT_MODEL_PATH", "text_fraud_model.pkl")
+URL_MODEL_PATH = os.getenv("URL_MODEL_PATH", "url_fraud_model.pkl")
+FRAUD_CACHE_SIZE = int(os.getenv("FRAUD_CACHE_SIZE", "50000"))
+FRAUD_CACHE_TTL = float(os.getenv("FRAUD_CACHE_TTL", "3600"))
+URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", "50000"))
+# 'r' memory-maps model arrays so forked workers share pages; empty disables it
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "r") or None
+# Load models in the background at startup instead of on the first request
+FRAUD_WARM_UP = os.getenv("FRAUD_WARM_UP", "1") == "1"
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+# Shadow scoring of a candidate model runs on one background thread; at
+# most this many sampled batches wait for it before samples are dropped
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "4"))
+# Shared secret for /api/admin (X-Admin-Token); empty disables those endpoints
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# "sync" scores before saving a message; "async" saves it as pending and
+# scores it in the background queue worker
+FRAUD_SCORING_MODE = os.getenv("FRAUD_SCORING_MODE", "sync")
+FRAUD_QUEUE_BATCH_SIZE = int(os.getenv("FRAUD_QUEUE_BATCH_SIZE", "64"))
+FRAUD_QUEUE_POLL_INTERVAL = float(os.getenv("FRAUD_QUEUE_POLL_INTERVAL", "1.0"))
+
+# Observability: hot-path INFO logs keep only this fraction of records;
+# requests over either threshold are always logged as slow
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "50"))
@@ -0,0 +1,147 @@
+"""Keeps the conversations table in step with messages.
+
+Every helper runs inside the caller's session and never commits, so the
+conversation update lands in the same transaction as the messages.
+"""
+from sqlalchemy import and_, bindparam, case, event, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import config
+from models import Conversation
+from utils.cache import LRUCache
+
+# (low, high) -> conversation id; ids never change once assigned
+_conversation_ids = LRUCache(maxsize=config.CONVERSATION_CACHE_SIZE)
+
+
+# Ids read or created inside a transaction are only cached once it commits:
+# after a rollback the row may be gone and SQLite can hand its id to
+# another pair
+@event.listens_for(Session, "after_commit")
+def _cache_committed_ids(session):
+    for pair, conversation_id in session.info.pop("conversation_ids", {}).items():
+        _conversation_ids.set(pair, conversation_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_uncommitted_ids(session):
+    session.info.pop("conversation_ids", None)
+
+
+def ordered_pair(user_id: int, peer_id: int) -> tuple[int, int]:
+    return (user_id, peer_id) if user_id < peer_id else (peer_id, user_id)
+
+
+async def conversation_ids(db: AsyncSession, user_id: int, peer_ids) -> dict:
+    """Return peer_id -> conversation id, creating missing conversations."""
+    result = {}
+    missing = set()
+    for peer_id in set(peer_ids):
+        conversation_id = _conversation_ids.get(ordered_pair(user_id, peer_id))
+        if conversation_id is None:
+            missing.add(peer_id)
+        else:
+            result[peer_id] = conversation_id
+    if not missing:
+        return result
+
+    def lookup():
+        # Every pair contains user_id, so this stays on the two pair indexes
+        return db.execute(
+            select(Conversation.id, Conversation.user_low_id, Conversation.user_high_id).where(or_(
+                and_(Conversation.user_low_id == user_id, Conversation.user_high_id.in_(missing)),
+                and_(Conversation.user_high_id == user_id, Conversation.user_low_id.in_(missing)),
+            ))
+        )
+
+    found = {(row.user_low_id, row.user_high_id): row.id for row in await lookup()}
+    new_pairs = [ordered_pair(user_id, peer_id) for peer_id in missing if ordered_pair(user_id, peer_id) not in found]
+    if new_pairs:
+        # A concurrent first message may create the same pair; ignore the duplicate
+        await db.execute(
+            insert(Conversation).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql"),
+            [{"user_low_id": low, "user_high_id": high, "unread_low": 0, "unread_high": 0} for low, high in new_pairs]
+        )
+        found = {(row.user_low_id, row.user_high_id): row.id for row in await lookup()}
+
+    db.info.setdefault("conversation_ids", {}).update(found)
+    for pair, conversation_id in found.items():
+        result[pair[0] if pair[1] == user_id else pair[1]] = conversation_id
+    return result
+
+
+_record_stmt = (
+    update(Conversation.__table__)
+    .where(Conversation.__table__.c.id == bindparam("conversation_id"))
+    .values(
+        last_message_id=bindparam("message_id"),
+        last_message_at=bindparam("message_at"),
+        unread_low=Conversation.__table__.c.unread_low + bindparam("unread_low_delta"),
+        unread_high=Conversation.__table__.c.unread_high + bindparam("unread_high_delta"),
+    )
+)
+
+
+async def record_messages(db: AsyncSession, messages):
+    """Advance last-message pointers and receivers' unread counters.
+
+    ``messages`` are (conversation_id, message_id, timestamp, sender_id,
+    receiver_id) tuples. Counters are incremented in SQL so concurrent
+    sends never lose an update; one UPDATE runs per conversation touched.
+    """
+    params = {}
+    for conversation_id, message_id, timestamp, sender_id, receiver_id in messages:
+        entry = params.get(conversation_id)
+        if entry is None:
+            entry = params[conversation_id] = {
+                "conversation_id": conversation_id, "message_id": message_id, "message_at": timestamp,
+                "unread_low_delta": 0, "unread_high_delta": 0,
+            }
+        elif (timestamp, message_id) > (entry["message_at"], entry["message_id"]):
+            entry["message_id"], entry["message_at"] = message_id, timestamp
+        entry["unread_high_delta" if receiver_id > sender_id else "unread_low_delta"] += 1
+    if params:
+        await db.execute(_record_stmt, list(params.values()))
+
+
+async def lower_unread(db: AsyncSession, messages):
+    """Lower receivers' unread counters for messages that just stopped being unread.
+
+    ``messages`` are (conversation_id, sender_id, receiver_id) tuples. One
+    UPDATE covers every conversation touched; counters never go below 0.
+    """
+    deltas = {}
+    for conversation_id, sender_id, receiver_id in messages:
+        if conversation_id is None:
+            continue
+        low, high = deltas.get(conversation_id, (0, 0))
+        deltas[conversation_id] = (low, high + 1) if receiver_id > sender_id else (low + 1, high)
+    if not deltas:
+        return
+    table = Conversation.__table__
+    values = {}
+    for name, side in (("unread_low", 0), ("unread_high", 1)):
+        column = table.c[name]
+        whens = [
+            (table.c.id == conversation_id, case((column > delta[side], column - delta[side]), else_=0))
+            for conversation_id, delta in deltas.items() if delta[side]
+        ]
+        if whens:
+            values[name] = case(*whens, else_=column)
+    await db.execute(update(table).where(table.c.id.in_(deltas)).values(**values))
+
+
+async def clear_unread(db: AsyncSession, user_id: int, conversation_ids):
+    """Zero ``user_id``'s unread counters; conversations they are not in are untouched."""
+    table = Conversation.__table__
+    ids = list(conversation_ids)
+    await db.execute(update(table).where(table.c.id.in_(ids), table.c.user_low_id == user_id).values(unread_low=0))
+    await db.execute(update(table).where(table.c.id.in_(ids), table.c.user_high_id == user_id).values(unread_high=0))
+
+
+def unread_count(conversation, user_id: int) -> int:
+    return conversation.unread_low if conversation.user_low_id == user_id else conversation.unread_high
+
+
+def peer_of(conversation, user_id: int) -> int:
+    return conversation.user_high_id if conversation.user_low_id == user_id else conversation.user_low_id
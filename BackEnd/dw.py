@@ -1,3 +1,7 @@
+# Bundle the NLTK data used by preprocessing.py next to the app (run at build time).
+# The English stopwords are committed under nltk_data/ for deploys without a
+# build step (vercel.json); this refreshes them.
 import nltk
-nltk.download('punkt_tab')
-nltk.download('stopwords')
\ No newline at end of file
+import config
+
+nltk.download('stopwords', download_dir=config.NLTK_DATA_DIR)
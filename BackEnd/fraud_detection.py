@@ -1,26 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pydantic import BaseModel
-import joblib
+import hashlib
+import logging
+import random
 import re
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
-import pandas as pd
-import nltk
-
-# Download NLTK resources
-try:
-    nltk.download('punkt_tab', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except Exception as e:
-    print(f"Error downloading NLTK resources: {e}")
-
-# Load ML models
-try:
-    text_fraud_model = joblib.load('text_fraud_model.pkl')
-    url_fraud_model = joblib.load('url_fraud_model.pkl')
-except FileNotFoundError:
-    print("Error: Model files (text_fraud_model.pkl, url_fraud_model.pkl) not found.")
-    exit(1)
+import threading
+import time
+import numpy as np
+import config
+from model_registry import ModelsUnavailable, registry
+from preprocessing import get_preprocessor
+from utils.batching import MicroBatcher
+from utils.cache import LRUCache
+from utils.metrics import COUNT_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+
+FRAUD_THRESHOLD = 0.7
+URL_PATTERN = re.compile(r'http\S+')
+URL_FEATURES = ['length', 'num_subdomains', 'has_https', 'has_suspicious_words']
+SUSPICIOUS_WORDS = ('login', 'verify', 'account', 'secure')
+
+# Repeated content (broadcasts, forwarded chains) is answered from these.
+# Keys include the model version, and loading models clears both caches.
+# The URL model only sees the four URL features, so its verdicts are cached
+# per feature row: any URL with the same features gets the same answer.
+_result_cache = LRUCache(maxsize=config.FRAUD_CACHE_SIZE, ttl=config.FRAUD_CACHE_TTL)
+_url_cache = LRUCache(maxsize=config.URL_CACHE_SIZE, ttl=config.FRAUD_CACHE_TTL)
+
+
+
+def _clear_caches(bundle):
+    _result_cache.clear()
+    _url_cache.clear()
+
+
+registry.on_load(_clear_caches)
+
+# Per-batch timings, so preprocessing cost can be told apart from inference
+stage_seconds = metrics.histogram(
+    "fraud_stage_duration_seconds", "Time spent per scoring batch in each stage", ["stage"]
+)
+batch_sizes = metrics.histogram("fraud_batch_size", "Messages per scoring batch", buckets=COUNT_BUCKETS)
+model_seconds = metrics.histogram(
+    "fraud_model_inference_seconds", "Inference time per scoring batch, live model vs shadowed candidate", ["role"]
+)
+
+
+def _preprocessor():
+    try:
+        return get_preprocessor()
+    except LookupError as e:
+        # NLTK stopwords are missing from NLTK_DATA_DIR (run dw.py)
+        raise ModelsUnavailable(str(e)) from e
+
+
+def warm_up():
+    """Load the models and stopwords ahead of the first request."""
+    registry.get()
+    _preprocessor()
+
+
+def scoring_status():
+    status = registry.status()
+    try:
+        _preprocessor()
+    except ModelsUnavailable as e:
+        status["ready"] = False
+        status["error"] = status["error"] or str(e)
+    return status
 
 
 # Pydantic model for fraud detection
@@ -28,60 +77,164 @@ class FraudDetectionRequest(BaseModel):
     content: str
 
 
-# Preprocess text
+class FraudDetectionBatchRequest(BaseModel):
+    contents: list[str]
+
+
 def clean_text(text):
-    if not isinstance(text, str):
-        return ''
-    text = text.lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    text = re.sub(r'http\S+', '', text)
-    words = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    filtered_words = [word for word in words if word not in stop_words]
-    stemmer = PorterStemmer()
-    stemmed_words = [stemmer.stem(word) for word in filtered_words]
-    return ' '.join(stemmed_words)
-
-
-# Extract URL features
-def extract_url_features(url):
+    return _preprocessor().clean(text)
+
+
+def _url_feature_row(url):
     if not isinstance(url, str):
         url = ''
-    return {
-        'length': len(url),
-        'num_subdomains': url.count('.') - 1 if url.startswith('http') else url.count('.'),
-        'has_https': 1 if 'https' in url.lower() else 0,
-        'has_suspicious_words': 1 if any(
-            word in url.lower() for word in ['login', 'verify', 'account', 'secure']) else 0
-    }
+    lower = url.lower()
+    return (
+        len(url),
+        url.count('.') - url.startswith('http'),
+        int('https' in lower),
+        int(any(word in lower for word in SUSPICIOUS_WORDS)),
+    )
+
+
+def _predict_url_proba(url_model, features):
+    # Models fitted on a DataFrame warn when given bare arrays
+    if getattr(url_model, 'feature_names_in_', None) is not None:
+        import pandas as pd
+        features = pd.DataFrame(features, columns=URL_FEATURES)
+    return url_model.predict_proba(features)[:, 1]
+
+
+def _score_urls(bundle, urls):
+    """Score URLs with at most one predict_proba call, over feature rows not cached yet."""
+    rows = [_url_feature_row(url) for url in urls]
+    verdicts = {}
+    unseen = []
+    for row in dict.fromkeys(rows):
+        prob = _url_cache.get((bundle.version, row))
+        if prob is None:
+            unseen.append(row)
+        else:
+            verdicts[row] = prob
+    if unseen:
+        features = np.array(unseen, dtype=np.int64)
+        for row, prob in zip(unseen, _predict_url_proba(bundle.url_model, features).tolist()):
+            verdicts[row] = prob
+            _url_cache.set((bundle.version, row), prob)
+    return [verdicts[row] for row in rows]
+
+
+def _infer(bundle, cleaned, urls_per_message, stages=False):
+    """Verdicts for preprocessed messages, one predict_proba call per model."""
+    with stage_seconds.time("text_inference") if stages else nullcontext():
+        text_probs = bundle.text_model.predict_proba(cleaned)[:, 1]
+    with stage_seconds.time("url_inference") if stages else nullcontext():
+        url_probs = _score_urls(bundle, [url for urls in urls_per_message for url in urls])
+
+    results = []
+    offset = 0
+    for text_prob, urls in zip(text_probs, urls_per_message):
+        is_fraudulent = False
+        fraud_probability = 0.0
+        for prob in [text_prob, *url_probs[offset:offset + len(urls)]]:
+            if prob > FRAUD_THRESHOLD:
+                is_fraudulent = True
+                fraud_probability = max(fraud_probability, prob)
+        offset += len(urls)
+        results.append({
+            "is_fraudulent": is_fraudulent,
+            "fraud_probability": float(fraud_probability)
+        })
+    return results
+
+
+# Candidates are shadow-scored off the request path on their own thread; a
+# sample is dropped rather than queued when the thread falls behind
+_shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fraud-shadow")
+_shadow_slots = threading.BoundedSemaphore(config.SHADOW_MAX_PENDING)
+
+
+def _shadow_score(candidate, stats, cleaned, urls_per_message, live_results, live_seconds):
+    try:
+        started = time.perf_counter()
+        candidate_results = _infer(candidate, cleaned, urls_per_message)
+        candidate_seconds = time.perf_counter() - started
+        model_seconds.observe(candidate_seconds, "candidate")
+        stats.record(live_results, candidate_results, live_seconds, candidate_seconds)
+    except Exception as e:
+        logger.warning("Shadow scoring with %s failed: %s", candidate.version, e)
+    finally:
+        _shadow_slots.release()
+
+
+def _maybe_shadow(cleaned, urls_per_message, live_results, live_seconds):
+    candidate, stats, rate = registry.candidate, registry.shadow, registry.shadow_rate
+    if candidate is None or stats is None or rate <= 0 or random.random() >= rate:
+        return
+    if not _shadow_slots.acquire(blocking=False):
+        stats.dropped += 1
+        return
+    _shadow_pool.submit(_shadow_score, candidate, stats, cleaned, urls_per_message, live_results, live_seconds)
+
+
+# Score a batch of messages with one predict_proba call per model
+def _score_batch(contents):
+    bundle = registry.get()
+    batch_sizes.observe(len(contents))
+    with stage_seconds.time("preprocess"):
+        cleaned = _preprocessor().transform(contents)
+        urls_per_message = [URL_PATTERN.findall(content) for content in contents]
+
+    started = time.perf_counter()
+    results = _infer(bundle, cleaned, urls_per_message, stages=True)
+    live_seconds = time.perf_counter() - started
+    model_seconds.observe(live_seconds, "live")
+    _maybe_shadow(cleaned, urls_per_message, results, live_seconds)
+    return results
+
+
+# Inference runs on a worker pool; concurrent requests share one batch
+scoring_engine = MicroBatcher(
+    _score_batch,
+    max_batch_size=config.FRAUD_MAX_BATCH_SIZE,
+    max_wait=config.FRAUD_MAX_WAIT_MS / 1000,
+    max_workers=config.FRAUD_WORKERS,
+    name="fraud-scoring",
+)
+
+
+def _content_key(content):
+    # Scoring ignores runs of whitespace, so collapse them before hashing
+    normalized = ' '.join(content.split()) if isinstance(content, str) else ''
+    return hashlib.blake2b(f"{registry.version}\0{normalized}".encode(), digest_size=16).digest()
 
 
 # Fraud detection function
 async def detect_fraud(request: FraudDetectionRequest):
-    content = request.content
-    cleaned_text = clean_text(content)
-
-    # Check for URLs in content
-    urls = re.findall(r'http\S+', content)
-    is_fraudulent = False
-    fraud_probability = 0.0
-
-    # Text classification
-    text_prob = text_fraud_model.predict_proba([cleaned_text])[0][1]
-    if text_prob > 0.7:
-        is_fraudulent = True
-        fraud_probability = max(fraud_probability, text_prob)
-
-    # URL classification
-    for url in urls:
-        url_features = extract_url_features(url)
-        url_features_df = pd.DataFrame([url_features])
-        url_prob = url_fraud_model.predict_proba(url_features_df)[0][1]
-        if url_prob > 0.7:
-            is_fraudulent = True
-            fraud_probability = max(fraud_probability, url_prob)
+    return (await detect_fraud_many([request.content]))[0]
+
+
+async def detect_fraud_many(contents: list[str]):
+    keys = [_content_key(content) for content in contents]
+    results = [_result_cache.get(key) for key in keys]
+    # Score each distinct uncached content once
+    pending = {}
+    for i, (key, result) in enumerate(zip(keys, results)):
+        if result is None:
+            pending.setdefault(key, []).append(i)
+    if pending:
+        scored = await scoring_engine.submit_many([contents[indices[0]] for indices in pending.values()])
+        for (key, indices), result in zip(pending.items(), scored):
+            _result_cache.set(key, result)
+            for i in indices:
+                results[i] = result
+    # Hand out copies so callers cannot mutate cached entries
+    return [dict(result) for result in results]
 
+
+def cache_stats():
     return {
-        "is_fraudulent": is_fraudulent,
-        "fraud_probability": float(fraud_probability)
-    }
\ No newline at end of file
+        "model_version": registry.version,
+        "content": _result_cache.stats(),
+        "url": _url_cache.stats(),
+    }
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import delete, func, select, update
+import config
+from database import AsyncSessionLocal
+from fraud_detection import detect_fraud_many
+from models import FraudScoringJob, Message
+from rate_limit import limiter
+from realtime import hub
+
+logger = logging.getLogger(__name__)
+
+
+class FraudScoringWorker:
+    """Drains fraud_scoring_queue in batches and bulk-updates the messages.
+
+    Used when FRAUD_SCORING_MODE=async: send_message commits the message as
+    pending together with a queue row, and this worker scores it later.
+    """
+
+    def __init__(self, batch_size=64, poll_interval=1.0):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.scored_total = 0
+        self.failed_batches = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_lag_seconds = 0.0
+        # Queue rows left after the last batch, and the oldest one's enqueue
+        # time, for /metrics without a query per scrape
+        self.backlog_depth = 0
+        self.oldest_pending_at = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Wake the worker right away instead of at the next poll."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                self.failed_batches += 1
+                logger.error("Fraud scoring batch failed: %s", e)
+                processed = 0
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    FraudScoringJob.id, FraudScoringJob.message_id, FraudScoringJob.enqueued_at,
+                    Message.content, Message.sender_id, Message.receiver_id
+                )
+                .outerjoin(Message, Message.id == FraudScoringJob.message_id)
+                .order_by(FraudScoringJob.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True, of=FraudScoringJob)
+            )).all()
+            if not rows:
+                self.backlog_depth, self.oldest_pending_at = 0, None
+                return 0
+
+            started = time.perf_counter()
+            # Jobs whose message no longer exists are simply dropped
+            live = [row for row in rows if row.content is not None]
+            results = await detect_fraud_many([row.content for row in live])
+            if live:
+                await db.execute(update(Message), [
+                    {
+                        "id": row.message_id,
+                        "is_fraudulent": result["is_fraudulent"],
+                        "fraud_probability": result["fraud_probability"],
+                        "fraud_status": "scored",
+                    }
+                    for row, result in zip(live, results)
+                ])
+            await db.execute(delete(FraudScoringJob).where(FraudScoringJob.id.in_([row.id for row in rows])))
+            self.backlog_depth, self.oldest_pending_at = (await db.execute(
+                select(func.count(FraudScoringJob.id), func.min(FraudScoringJob.enqueued_at))
+            )).one()
+            await db.commit()
+
+        now = datetime.utcnow()
+        self.scored_total += len(live)
+        self.last_batch_size = len(rows)
+        self.last_batch_seconds = time.perf_counter() - started
+        self.last_lag_seconds = max((now - row.enqueued_at).total_seconds() for row in rows)
+
+        for row, result in zip(live, results):
+            limiter.record_fraud(row.sender_id, result["fraud_probability"])
+            event = {"type": "fraud_status", "data": {"id": row.message_id, "fraud_status": "scored", **result}}
+            hub.publish(row.receiver_id, event)
+            hub.publish(row.sender_id, event)
+        return len(rows)
+
+    def oldest_pending_seconds(self) -> float:
+        """Age of the oldest job left after the last batch; grows while the worker is stuck."""
+        if self.oldest_pending_at is None:
+            return 0.0
+        return (datetime.utcnow() - self.oldest_pending_at).total_seconds()
+
+    async def stats(self):
+        async with AsyncSessionLocal() as db:
+            depth, oldest = (await db.execute(
+                select(func.count(FraudScoringJob.id), func.min(FraudScoringJob.enqueued_at))
+            )).one()
+        return {
+            "mode": config.FRAUD_SCORING_MODE,
+            "running": self._task is not None and not self._task.done(),
+            "backlog_depth": depth,
+            "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "scored_total": self.scored_total,
+            "failed_batches": self.failed_batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_lag_seconds": self.last_lag_seconds,
+        }
+
+
+scoring_worker = FraudScoringWorker(
+    batch_size=config.FRAUD_QUEUE_BATCH_SIZE,
+    poll_interval=config.FRAUD_QUEUE_POLL_INTERVAL,
+)
@@ -1,16 +1,104 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import jwt
-from sqlalchemy.orm import Session
-from database import Base, engine, SessionLocal
-from routers import users, messages
-from fraud_detection import FraudDetectionRequest, detect_fraud
+import config
+from database import engine
+from routers import admin, users, messages
+from migrations import init_db
+from fraud_detection import (
+    FraudDetectionRequest, FraudDetectionBatchRequest, cache_stats, detect_fraud, detect_fraud_many,
+    scoring_engine, scoring_status, warm_up
+)
+from model_registry import ModelsUnavailable
+from fraud_queue import scoring_worker
+from archive import archive_worker
+from realtime import hub
+from auth import get_current_user, token_cache_stats
+from rate_limit import check_scoring, scoring_limit
+from user_directory import directory
+import preprocessing
+from utils.logs import log_event
+from utils.metrics import COUNT_BUCKETS, QueryStats, current_query_stats, metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+request_queries = metrics.histogram(
+    "http_request_db_queries", "Database statements per HTTP request", ["route"], buckets=COUNT_BUCKETS
+)
+request_db_seconds = metrics.histogram(
+    "http_request_db_seconds", "Database time per HTTP request", ["route"]
+)
+
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+def _cache_stats():
+    fraud = cache_stats()
+    stats = {"fraud_content": fraud["content"], "fraud_url": fraud["url"], "token": token_cache_stats()}
+    stats.update({f"user_{key}": value for key, value in directory.stats().items()})
+    # The preprocessor is built lazily; skip its stem cache until then
+    if preprocessing._default is not None:
+        info = preprocessing._default.stem_cache_info()
+        total = info.hits + info.misses
+        stats["stem"] = {
+            "hits": info.hits, "misses": info.misses, "size": info.currsize,
+            "hit_rate": info.hits / total if total else 0.0,
+        }
+    return stats
 
-app = FastAPI()
+
+metrics.gauge("cache_hit_ratio", "Hit ratio since start", ["cache"],
+              fn=lambda: {(name, ): s["hit_rate"] for name, s in _cache_stats().items()})
+metrics.counter("cache_requests_total", "Cache lookups", ["cache", "result"],
+                fn=lambda: {(name, result): s[key] for name, s in _cache_stats().items()
+                            for result, key in (("hit", "hits"), ("miss", "misses"))})
+metrics.gauge("cache_entries", "Entries currently cached", ["cache"],
+              fn=lambda: {(name, ): s["size"] for name, s in _cache_stats().items()})
+metrics.gauge("websocket_connections", "Open WebSocket subscriptions",
+              fn=lambda: {(): hub.connection_count()})
+metrics.counter("fraud_queue_scored_total", "Messages scored by the background queue worker",
+                fn=lambda: {(): scoring_worker.scored_total})
+metrics.gauge("fraud_queue_backlog_depth", "Messages waiting for fraud scoring after the last batch",
+              fn=lambda: {(): scoring_worker.backlog_depth})
+metrics.gauge("fraud_queue_oldest_pending_seconds", "Age of the oldest message waiting for fraud scoring",
+              fn=lambda: {(): scoring_worker.oldest_pending_seconds()})
+metrics.gauge("fraud_queue_lag_seconds", "Longest enqueue-to-score delay in the last batch",
+              fn=lambda: {(): scoring_worker.last_lag_seconds})
+metrics.counter("archive_moved_total", "Messages moved to the archive by this process",
+                fn=lambda: {(): archive_worker.archived_total})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not config.SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set; set it (or APP_ENV=dev for local runs)")
+    if not os.getenv("SECRET_KEY"):
+        logger.warning("SECRET_KEY is not set; using a random key for APP_ENV=%s", config.APP_ENV)
+    # Create database tables and apply pending migrations
+    await init_db()
+    # Load models off the event loop so the app starts serving immediately;
+    # without warm-up they load on the first scoring request
+    if config.FRAUD_WARM_UP:
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, _warm_up_quietly)
+    if config.FRAUD_SCORING_MODE == "async":
+        scoring_worker.start()
+    if config.ARCHIVE_AFTER_DAYS > 0:
+        archive_worker.start()
+    yield
+    await archive_worker.stop()
+    await scoring_worker.stop()
+    await scoring_engine.close()
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -19,36 +107,97 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Has-More"],
 )
 
+def _route_template(request: Request) -> str:
+    """The matched route's path template, router prefix included."""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of included routers may keep their unprefixed path; the prefix
+    # is whatever the request path has in front of the filled-in template
+    path = request.scope["path"]
+    filled = route.path_format.format(**request.scope.get("path_params", {}))
+    prefix = path[:-len(filled)] if path.endswith(filled) else ""
+    return prefix + route.path
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        current_query_stats.reset(token)
+        # Label by route template, not raw path, to keep label cardinality bounded
+        path = _route_template(request)
+        request_seconds.observe(elapsed, request.method, path, str(status))
+        request_queries.observe(stats.count, path)
+        request_db_seconds.observe(stats.seconds, path)
+        slow = elapsed > config.SLOW_REQUEST_SECONDS or stats.count > config.SLOW_REQUEST_QUERIES
+        log_event(
+            logger, logging.WARNING if slow else logging.INFO, "slow_request" if slow else "request",
+            sample_rate=1.0 if slow else config.LOG_SAMPLE_RATE,
+            method=request.method, route=path, status=status,
+            duration_ms=round(elapsed * 1000, 2), queries=stats.count, db_ms=round(stats.seconds * 1000, 2),
+        )
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(messages.router, prefix="/api/messages", tags=["messages"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
-security = HTTPBearer()
-
-# Authentication dependency
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, "secret_key", algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        return user_id
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-# Database dependency
-def get_db():
-    db = SessionLocal()
+def _warm_up_quietly():
     try:
-        yield db
-    finally:
-        db.close()
+        warm_up()
+    except Exception as e:
+        logger.warning("Fraud scoring warm-up failed: %s", e)
+
+@app.exception_handler(ModelsUnavailable)
+async def models_unavailable_handler(request: Request, exc: ModelsUnavailable):
+    return JSONResponse(status_code=503, content={"detail": "Detecção de fraude indisponível"})
 
 # Fraud detection endpoint
 @app.post("/api/detect_fraud", response_model=dict)
-async def fraud_detection_endpoint(request: FraudDetectionRequest, db: Session = Depends(get_db)):
+async def fraud_detection_endpoint(request: FraudDetectionRequest, user_id: int = Depends(scoring_limit)):
     return await detect_fraud(request)
 
+@app.post("/api/detect_fraud/batch", response_model=list[dict])
+async def fraud_detection_batch_endpoint(
+        request: FraudDetectionBatchRequest,
+        user_id: int = Depends(get_current_user)
+):
+    if len(request.contents) > config.FRAUD_BATCH_MAX_CONTENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {config.FRAUD_BATCH_MAX_CONTENTS} textos por lote"
+        )
+    await check_scoring(user_id, len(request.contents))
+    return await detect_fraud_many(request.contents)
+
+@app.get("/api/detect_fraud/stats")
+async def fraud_detection_stats():
+    return cache_stats()
+
+@app.get("/api/detect_fraud/queue")
+async def fraud_queue_stats():
+    return await scoring_worker.stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    status = scoring_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/")
 async def root():
     return {"message": "Chat API"}
\ No newline at end of file
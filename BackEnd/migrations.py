@@ -0,0 +1,108 @@
+"""Idempotent schema upgrades for databases created by older versions.
+
+``Base.metadata.create_all`` only creates missing tables, so indexes and
+columns added to existing models are applied here on startup.
+"""
+from sqlalchemy import case, exists, func, insert, inspect, literal, select, text, union, update
+from archive import partition_table
+from database import Base
+import models  # noqa: F401  (registers the tables on Base.metadata)
+from models import ArchivePartition, ArchivePartitionUser, Conversation, Message
+from search_index import create_search_index
+
+
+def add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT '{column.server_default.arg}'"
+            conn.execute(text(ddl))
+
+
+def create_missing_indexes(conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def backfill_conversations(conn):
+    """Group messages written before conversations existed into conversations.
+
+    Only does work while some message has no conversation_id; counters and
+    last-message pointers are then recomputed from the messages.
+    """
+    messages = Message.__table__
+    conversations = Conversation.__table__
+    pending = messages.c.conversation_id.is_(None)
+    if conn.execute(select(messages.c.id).where(pending).limit(1)).first() is None:
+        return
+
+    low = case((messages.c.sender_id < messages.c.receiver_id, messages.c.sender_id), else_=messages.c.receiver_id)
+    high = case((messages.c.sender_id < messages.c.receiver_id, messages.c.receiver_id), else_=messages.c.sender_id)
+    same_pair = (conversations.c.user_low_id == low) & (conversations.c.user_high_id == high)
+    conn.execute(insert(conversations).from_select(
+        ["user_low_id", "user_high_id"],
+        select(low, high).where(pending, ~exists().where(same_pair)).distinct(),
+    ))
+    conn.execute(update(messages).where(pending).values(
+        conversation_id=select(conversations.c.id).where(same_pair).scalar_subquery()
+    ))
+
+    in_conversation = messages.c.conversation_id == conversations.c.id
+    unread = messages.c.read == False  # noqa: E712
+    conn.execute(update(conversations).values(
+        last_message_id=select(func.max(messages.c.id)).where(in_conversation).scalar_subquery(),
+        last_message_at=select(func.max(messages.c.timestamp)).where(in_conversation).scalar_subquery(),
+        unread_low=select(func.count()).where(
+            in_conversation, messages.c.receiver_id == conversations.c.user_low_id, unread
+        ).scalar_subquery(),
+        unread_high=select(func.count()).where(
+            in_conversation, messages.c.receiver_id == conversations.c.user_high_id, unread
+        ).scalar_subquery(),
+    ))
+
+
+def backfill_archive_users(conn):
+    """Record the users of archive partitions written before those records existed."""
+    users = ArchivePartitionUser.__table__
+    if conn.execute(select(users.c.month).limit(1)).first() is not None:
+        return
+    for month in conn.scalars(select(ArchivePartition.month)).all():
+        table = partition_table(month)
+        members = union(
+            select(table.c.sender_id.label("user_id")), select(table.c.receiver_id.label("user_id"))
+        ).subquery()
+        conn.execute(insert(users).from_select(["user_id", "month"], select(members.c.user_id, literal(month))))
+
+
+MIGRATIONS = [
+    add_missing_columns,
+    create_missing_indexes,
+    backfill_conversations,
+    backfill_archive_users,
+    create_search_index,
+]
+
+
+def run_migrations(conn):
+    """Run every migration on a sync connection (use AsyncConnection.run_sync)."""
+    for migration in MIGRATIONS:
+        migration(conn)
+
+
+async def init_db():
+    from database import engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(init_db())
+    print("Migrations applied.")
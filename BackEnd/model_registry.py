@@ -0,0 +1,254 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import joblib
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ModelsUnavailable(Exception):
+    """Raised when the fraud models cannot be loaded."""
+
+
+class ModelBundle:
+    __slots__ = ("version", "text_model", "url_model", "text_path", "url_path", "loaded_at")
+
+    def __init__(self, version, text_model, url_model, text_path=None, url_path=None):
+        self.version = version
+        self.text_model = text_model
+        self.url_model = url_model
+        self.text_path = text_path
+        self.url_path = url_path
+        self.loaded_at = time.time()
+
+
+class ShadowStats:
+    """How a candidate's verdicts compare with the live ones on sampled batches.
+
+    Only the shadow scoring thread writes these; readers may see a batch
+    half-recorded, which is fine for monitoring.
+    """
+    __slots__ = ("live_version", "candidate_version", "batches", "compared", "agreed",
+                 "abs_diff_total", "live_seconds", "candidate_seconds", "dropped")
+
+    def __init__(self, live_version, candidate_version):
+        self.live_version = live_version
+        self.candidate_version = candidate_version
+        self.batches = 0
+        self.compared = 0
+        self.agreed = 0
+        self.abs_diff_total = 0.0
+        self.live_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self.dropped = 0
+
+    def record(self, live_results, candidate_results, live_seconds, candidate_seconds):
+        self.batches += 1
+        self.compared += len(live_results)
+        self.live_seconds += live_seconds
+        self.candidate_seconds += candidate_seconds
+        for live, candidate in zip(live_results, candidate_results):
+            self.agreed += live["is_fraudulent"] == candidate["is_fraudulent"]
+            self.abs_diff_total += abs(live["fraud_probability"] - candidate["fraud_probability"])
+
+    def snapshot(self):
+        compared = self.compared
+        return {
+            "live_version": self.live_version,
+            "candidate_version": self.candidate_version,
+            "batches": self.batches,
+            "compared": compared,
+            "agreement_rate": self.agreed / compared if compared else None,
+            "mean_abs_probability_diff": self.abs_diff_total / compared if compared else None,
+            # Per message, so batch sizes do not skew the comparison
+            "live_ms_per_message": self.live_seconds * 1000 / compared if compared else None,
+            "candidate_ms_per_message": self.candidate_seconds * 1000 / compared if compared else None,
+            "dropped_samples": self.dropped,
+        }
+
+
+def file_version(*paths):
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Loads the fraud models on first use (or on warm-up) instead of at import.
+
+    Arrays are memory-mapped when MODEL_MMAP_MODE is set, so workers forked
+    from one parent share the same pages.
+
+    New versions are rolled out without a restart: ``start_candidate_load``
+    loads a candidate bundle on a background thread while the live one keeps
+    serving, optionally shadow-scoring a sample of traffic, and ``promote``
+    swaps it in with a single reference assignment. Batches already running
+    finish on the bundle they started with. The replaced bundle is kept for
+    ``rollback``.
+    """
+
+    def __init__(self, text_path, url_path, mmap_mode=None):
+        self.text_path = text_path
+        self.url_path = url_path
+        self.mmap_mode = mmap_mode
+        self.error = None
+        self._bundle = None
+        self._previous = None
+        self._candidate = None
+        self.candidate_state = None
+        self.shadow_rate = 0.0
+        self.shadow = None
+        self._lock = threading.Lock()
+        self._candidate_lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def ready(self):
+        return self._bundle is not None
+
+    @property
+    def version(self):
+        bundle = self._bundle
+        return bundle.version if bundle is not None else None
+
+    @property
+    def candidate(self):
+        return self._candidate
+
+    def on_load(self, callback):
+        """Call ``callback(bundle)`` every time a new bundle goes live."""
+        self._listeners.append(callback)
+
+    def get(self) -> ModelBundle:
+        bundle = self._bundle
+        if bundle is not None:
+            return bundle
+        with self._lock:
+            if self._bundle is None:
+                self._load_live_locked(self.text_path, self.url_path)
+            return self._bundle
+
+    def load(self, text_path=None, url_path=None) -> ModelBundle:
+        with self._lock:
+            return self._load_live_locked(text_path or self.text_path, url_path or self.url_path)
+
+    def _load_text_model(self, path):
+        # .npz is the compact hashed linear model exported by train_fraud_model.py
+        if path.endswith(".npz"):
+            from compact_model import CompactTextModel
+            return CompactTextModel.load(path)
+        return joblib.load(path, mmap_mode=self.mmap_mode)
+
+    def _load_bundle(self, text_path, url_path) -> ModelBundle:
+        started = time.perf_counter()
+        try:
+            bundle = ModelBundle(
+                file_version(text_path, url_path),
+                self._load_text_model(text_path),
+                joblib.load(url_path, mmap_mode=self.mmap_mode),
+                text_path,
+                url_path,
+            )
+        except Exception as e:
+            logger.error("Could not load fraud models: %s", e)
+            raise ModelsUnavailable(str(e)) from e
+        logger.info("Fraud models %s loaded in %.2fs", bundle.version, time.perf_counter() - started)
+        return bundle
+
+    def _load_live_locked(self, text_path, url_path) -> ModelBundle:
+        try:
+            bundle = self._load_bundle(text_path, url_path)
+        except ModelsUnavailable as e:
+            self.error = str(e)
+            raise
+        return self._activate(bundle)
+
+    def _activate(self, bundle: ModelBundle) -> ModelBundle:
+        """Make ``bundle`` live; the caller holds ``_lock``."""
+        self._previous = self._bundle
+        self.text_path, self.url_path = bundle.text_path, bundle.url_path
+        self._bundle = bundle
+        self.error = None
+        for callback in self._listeners:
+            callback(bundle)
+        return bundle
+
+    def start_candidate_load(self, text_path=None, url_path=None, shadow_rate=0.0) -> bool:
+        """Load a candidate on a background thread; False if one is already loading."""
+        with self._candidate_lock:
+            if self.candidate_state is not None and self.candidate_state["state"] == "loading":
+                return False
+            text_path, url_path = text_path or self.text_path, url_path or self.url_path
+            self.candidate_state = {"state": "loading", "text_path": text_path, "url_path": url_path, "error": None}
+        threading.Thread(
+            target=self._load_candidate, args=(text_path, url_path, shadow_rate),
+            name="fraud-candidate-load", daemon=True,
+        ).start()
+        return True
+
+    def _load_candidate(self, text_path, url_path, shadow_rate):
+        try:
+            bundle = self._load_bundle(text_path, url_path)
+        except ModelsUnavailable as e:
+            with self._candidate_lock:
+                self.candidate_state = {**self.candidate_state, "state": "failed", "error": str(e)}
+            return
+        with self._candidate_lock:
+            self.shadow = ShadowStats(self.version, bundle.version)
+            self._candidate = bundle
+            self.shadow_rate = shadow_rate
+            self.candidate_state = {**self.candidate_state, "state": "ready", "version": bundle.version}
+
+    def discard_candidate(self):
+        with self._candidate_lock:
+            self._candidate = None
+            self.shadow_rate = 0.0
+            self.candidate_state = None
+
+    def promote(self) -> ModelBundle:
+        """Serve the loaded candidate; raise LookupError when there is none."""
+        with self._candidate_lock:
+            bundle = self._candidate
+            if bundle is None:
+                raise LookupError("no candidate loaded")
+            # Stop shadowing before the swap so a candidate never shadows itself
+            self._candidate = None
+            self.shadow_rate = 0.0
+            self.candidate_state = None
+        with self._lock:
+            self._activate(bundle)
+        logger.info("Fraud models %s promoted", bundle.version)
+        return bundle
+
+    def rollback(self) -> ModelBundle:
+        """Serve the bundle replaced by the last promote; raise LookupError when there is none."""
+        with self._lock:
+            bundle = self._previous
+            if bundle is None:
+                raise LookupError("no previous version")
+            self._activate(bundle)
+        logger.info("Fraud models rolled back to %s", bundle.version)
+        return bundle
+
+    def status(self):
+        bundle = self._bundle
+        previous = self._previous
+        shadow = self.shadow
+        return {
+            "ready": bundle is not None,
+            "model_version": bundle.version if bundle is not None else None,
+            "loaded_at": bundle.loaded_at if bundle is not None else None,
+            "error": self.error,
+            "previous_version": previous.version if previous is not None else None,
+            "candidate": self.candidate_state,
+            "shadow_rate": self.shadow_rate,
+            "shadow": shadow.snapshot() if shadow is not None else None,
+        }
+
+
+registry = ModelRegistry(config.TEXT_MODEL_PATH, config.URL_MODEL_PATH, mmap_mode=config.MODEL_MMAP_MODE)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -23,6 +23,61 @@ class Message(Base):
     read = Column(Boolean, default=False)
     is_fraudulent = Column(Boolean, default=False)
     fraud_probability = Column(Float, default=0.0)
+    # "pending" until the background worker scores it (FRAUD_SCORING_MODE=async)
+    fraud_status = Column(String(16), default="scored", server_default="scored")
+    conversation_id = Column(Integer, ForeignKey("conversations.id"))
 
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
-    receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
+
+    # Keyset pagination of inbox/sent walks these in (timestamp, id) order
+    __table_args__ = (
+        Index("ix_messages_receiver_timestamp_id", "receiver_id", "timestamp", "id"),
+        Index("ix_messages_sender_timestamp_id", "sender_id", "timestamp", "id"),
+        Index("ix_messages_conversation_timestamp_id", "conversation_id", "timestamp", "id"),
+    )
+
+class Conversation(Base):
+    """One row per pair of users, kept up to date by every send.
+
+    The pair is stored ordered (user_low_id < user_high_id) so it is unique;
+    each participant has their own unread counter.
+    """
+    __tablename__ = "conversations"
+    id = Column(Integer, primary_key=True)
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # No FK: messages already reference conversations
+    last_message_id = Column(Integer)
+    last_message_at = Column(DateTime)
+    unread_low = Column(Integer, default=0, server_default="0", nullable=False)
+    unread_high = Column(Integer, default=0, server_default="0", nullable=False)
+
+    # The chat list walks each participant's conversations by recency
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        Index("ix_conversations_low_last", "user_low_id", "last_message_at", "id"),
+        Index("ix_conversations_high_last", "user_high_id", "last_message_at", "id"),
+    )
+
+class FraudScoringJob(Base):
+    """Durable queue of messages waiting for fraud scoring."""
+    __tablename__ = "fraud_scoring_queue"
+    id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, ForeignKey("messages.id"), unique=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivePartition(Base):
+    """One per-month table of archived messages (see archive.py)."""
+    __tablename__ = "message_archive_partitions"
+    month = Column(String(7), primary_key=True)  # "YYYY-MM"
+    table_name = Column(String(64), nullable=False)
+    row_count = Column(Integer, default=0, server_default="0", nullable=False)
+    oldest_at = Column(DateTime)
+    newest_at = Column(DateTime)
+
+class ArchivePartitionUser(Base):
+    """Users with messages, sent or received, in an archive partition."""
+    __tablename__ = "message_archive_partition_users"
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
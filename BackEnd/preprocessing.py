@@ -0,0 +1,84 @@
+import re
+import threading
+from functools import lru_cache
+from joblib import Parallel, delayed
+import config
+
+# Bump whenever clean() output changes, so cached training features are rebuilt
+PREPROCESSING_VERSION = 2
+
+NON_LETTERS = re.compile(r'[^a-zA-Z\s]')
+URLS = re.compile(r'http\S+')
+# word_tokenize (Treebank CONTRACTIONS2) splits these; the shipped models
+# were trained on its tokens, so reproduce the splits
+CONTRACTIONS = re.compile(r'\b(can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na\b))')
+
+
+class TextPreprocessor:
+    """Lowercase, strip non-letters, drop stopwords and stem.
+
+    Stopwords, the stemmer and the regexes are built once; stems are cached
+    in a bounded LRU since message vocabularies repeat heavily.
+    """
+
+    def __init__(self, stem_cache_size=100_000, stop_words=None):
+        # Importing nltk takes about a second, so it is deferred to first use
+        import nltk
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer
+
+        # Only use NLTK data bundled with the app (see dw.py): no system or home
+        # directory fallbacks and never a download at runtime
+        nltk.data.path[:] = [config.NLTK_DATA_DIR]
+
+        self.stem_cache_size = stem_cache_size
+        self.stop_words = frozenset(stop_words if stop_words is not None else stopwords.words('english'))
+        self._stemmer = PorterStemmer()
+        self._stem = lru_cache(maxsize=stem_cache_size)(self._stemmer.stem)
+
+    def clean(self, text):
+        if not isinstance(text, str):
+            return ''
+        text = NON_LETTERS.sub('', text.lower())
+        text = CONTRACTIONS.sub(r'\1 ', URLS.sub('', text))
+        # Only letters and whitespace are left, so with the contraction splits
+        # above, str.split tokenizes exactly like word_tokenize
+        stop_words = self.stop_words
+        stem = self._stem
+        return ' '.join([stem(word) for word in text.split() if word not in stop_words])
+
+    def transform(self, texts, n_jobs=1, chunk_size=10_000):
+        texts = list(texts)
+        # Worker start-up costs more than cleaning a few thousand short texts
+        if n_jobs == 1 or len(texts) <= chunk_size:
+            return [self.clean(text) for text in texts]
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        results = Parallel(n_jobs=n_jobs)(delayed(self._clean_chunk)(chunk) for chunk in chunks)
+        return [text for chunk in results for text in chunk]
+
+    def _clean_chunk(self, texts):
+        return [self.clean(text) for text in texts]
+
+    def stem_cache_info(self):
+        return self._stem.cache_info()
+
+    # The LRU wrapper cannot be pickled; rebuild it in worker processes
+    def __getstate__(self):
+        return {'stem_cache_size': self.stem_cache_size, 'stop_words': self.stop_words}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_preprocessor() -> TextPreprocessor:
+    """Shared instance, built on first use so importing stays cheap."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = TextPreprocessor()
+    return _default
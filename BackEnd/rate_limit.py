@@ -0,0 +1,154 @@
+"""Token-bucket rate limiting, checked before any DB or model work.
+
+Buckets live behind ``RateLimitBackend`` so a shared store (e.g. Redis)
+can replace the in-process one when several workers must share limits.
+Senders whose recent messages score as likely fraud get smaller buckets.
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from fastapi import Depends, HTTPException, Request
+import config
+from auth import get_current_user
+from utils.cache import LRUCache
+from utils.metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+rate_limited = metrics.counter("rate_limited_total", "Requests rejected by the rate limiter", ["scope"])
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key, capacity: float, refill_per_second: float, cost: float = 1.0) -> float:
+        """Remove ``cost`` tokens from ``key``'s bucket.
+
+        Return 0 when they were available, otherwise the seconds until they
+        will be; a rejected call takes nothing. A cost above the capacity is
+        accepted from a full bucket and leaves it in debt, so large requests
+        are still paid for in full.
+        """
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Buckets in a bounded LRU map, local to this process.
+
+    An evicted bucket comes back full, which only favours keys idle long
+    enough to have refilled anyway.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self._buckets = LRUCache(maxsize=max_keys)
+
+    async def take(self, key, capacity, refill_per_second, cost=1.0):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets.set(key, bucket)
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+        bucket[1] = now
+        needed = min(cost, capacity)
+        if tokens >= needed:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (needed - tokens) / refill_per_second
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_BACKENDS = {"memory": InMemoryBackend}
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, fraud_alpha=0.3, min_factor=0.1, fraud_ttl=3600):
+        self.backend = backend
+        self.fraud_alpha = fraud_alpha
+        self.min_factor = min_factor
+        # user_id -> EWMA of fraud_probability; forgotten after fraud_ttl of silence
+        self._fraud = LRUCache(maxsize=config.RATE_LIMIT_MAX_KEYS, ttl=fraud_ttl)
+
+    def record_fraud(self, user_id: int, probability: float):
+        previous = self._fraud.get(user_id)
+        if previous is None:
+            previous = 0.0
+        self._fraud.set(user_id, previous + self.fraud_alpha * (probability - previous))
+
+    def fraud_factor(self, user_id: int) -> float:
+        """Bucket scale for a sender: 1.0 when clean, down to ``min_factor``."""
+        score = self._fraud.get(user_id)
+        return 1.0 if score is None else max(self.min_factor, 1.0 - score)
+
+    async def check(self, scope: str, key, per_minute: float, burst: float, factor=1.0, cost=1.0):
+        """Raise 429 when ``key`` is over its ``scope`` limit."""
+        if not config.RATE_LIMIT_ENABLED:
+            return
+        retry_after = await self.backend.take(
+            (scope, key), max(1.0, burst * factor), per_minute * factor / 60, cost
+        )
+        if retry_after:
+            rate_limited.inc(scope)
+            logger.debug("Rate limited %s for %s, retry in %.1fs", scope, key, retry_after)
+            raise HTTPException(
+                status_code=429,
+                detail="Muitas requisições, tente novamente mais tarde",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+
+limiter = RateLimiter(
+    _BACKENDS[config.RATE_LIMIT_BACKEND](max_keys=config.RATE_LIMIT_MAX_KEYS),
+    fraud_alpha=config.FRAUD_THROTTLE_ALPHA,
+    min_factor=config.FRAUD_THROTTLE_MIN_FACTOR,
+    fraud_ttl=config.FRAUD_THROTTLE_TTL,
+)
+
+
+async def sender_limit(user_id: int = Depends(get_current_user)) -> int:
+    """Dependency: the authenticated user_id, once their send bucket allows one message."""
+    await limiter.check(
+        "send", user_id, config.SEND_RATE_PER_MINUTE, config.SEND_BURST, factor=limiter.fraud_factor(user_id)
+    )
+    return user_id
+
+
+async def check_bulk_sender(user_id: int, recipients: int):
+    """Raise 429 when ``user_id`` cannot fan out to ``recipients`` more phones yet.
+
+    Bulk sends draw on their own bucket, so a broadcast never blocks /send.
+    """
+    await limiter.check(
+        "send_bulk", user_id, config.BULK_RATE_PER_MINUTE, config.BULK_BURST,
+        factor=limiter.fraud_factor(user_id), cost=recipients
+    )
+
+
+async def check_scoring(user_id: int, texts: int):
+    """Raise 429 when ``user_id`` cannot have ``texts`` more texts scored via /api/detect_fraud yet."""
+    await limiter.check("detect_fraud", user_id, config.FRAUD_API_RATE_PER_MINUTE, config.FRAUD_API_BURST, cost=texts)
+
+
+async def scoring_limit(user_id: int = Depends(get_current_user)) -> int:
+    """Dependency: the authenticated user_id, once their scoring bucket allows one text."""
+    await check_scoring(user_id, 1)
+    return user_id
+
+
+def client_address(request: Request) -> str:
+    """The caller's address, taken from CLIENT_IP_HEADER when one is configured."""
+    if config.CLIENT_IP_HEADER:
+        # The nearest proxy appends the address it saw; earlier entries are client-supplied
+        forwarded = request.headers.get(config.CLIENT_IP_HEADER, "").rsplit(",", 1)[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.client.host if request.client else "unknown"
+
+
+def ip_limit(scope: str):
+    """Dependency: limit unauthenticated endpoints by client address (see CLIENT_IP_HEADER)."""
+    async def dependency(request: Request):
+        await limiter.check(scope, client_address(request), config.AUTH_RATE_PER_MINUTE, config.AUTH_BURST)
+    return dependency
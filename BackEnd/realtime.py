@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections import defaultdict
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One WebSocket connection's bounded outbound queue."""
+
+    __slots__ = ("user_id", "queue", "overflowed")
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class MessageHub:
+    """In-process fan-out of events to the connections of each user.
+
+    Publishing never waits: when a connection's queue is full the connection
+    is marked as overflowed and dropped, so a slow client cannot hold up the
+    sender or the other subscribers. Clients resync through /inbox?after=.
+    Only connections served by this worker process are reached.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, event: dict) -> int:
+        delivered = 0
+        for subscription in list(self._subscribers.get(user_id, ())):
+            try:
+                subscription.queue.put_nowait(event)
+                delivered += 1
+            except asyncio.QueueFull:
+                logger.warning("Dropping slow WebSocket subscriber for user %s", user_id)
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+        return delivered
+
+    def connection_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+
+hub = MessageHub(queue_size=config.WS_QUEUE_SIZE)
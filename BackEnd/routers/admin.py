@@ -0,0 +1,55 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from model_registry import registry
+from schemas import CandidateModelRequest
+import config
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administração desabilitada")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        logger.warning("Rejected admin request with invalid token")
+        raise HTTPException(status_code=401, detail="Token de administração inválido")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/models")
+async def model_status():
+    """Live, previous and candidate model versions plus shadow comparison stats."""
+    return registry.status()
+
+@router.post("/models/candidate", status_code=202)
+async def load_candidate(request: CandidateModelRequest):
+    """Start loading a candidate in the background; poll GET /models for progress."""
+    if not registry.start_candidate_load(request.text_path, request.url_path, request.shadow_rate):
+        raise HTTPException(status_code=409, detail="Já existe um modelo candidato carregando")
+    logger.info("Loading candidate models: text=%s url=%s", request.text_path, request.url_path)
+    return registry.status()
+
+@router.delete("/models/candidate")
+async def discard_candidate():
+    registry.discard_candidate()
+    return registry.status()
+
+@router.post("/models/promote")
+async def promote_candidate():
+    """Switch live scoring to the loaded candidate without dropping requests."""
+    try:
+        registry.promote()
+    except LookupError:
+        raise HTTPException(status_code=409, detail="Nenhum modelo candidato pronto")
+    return registry.status()
+
+@router.post("/models/rollback")
+async def rollback_models():
+    try:
+        registry.rollback()
+    except LookupError:
+        raise HTTPException(status_code=409, detail="Nenhuma versão anterior disponível")
+    return registry.status()
@@ -1,9 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from models import Message, User
-from schemas import MessageCreate, MessageOut
-from auth import get_db, get_current_user
-from fraud_detection import FraudDetectionRequest, detect_fraud
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Conversation, FraudScoringJob, Message
+from schemas import (
+    BulkMessageCreate, BulkSendResult, ConversationOut, ConversationReadRequest, MessageCreate, MessageOut
+)
+from auth import get_current_user, verify_token
+import config
+from database import AsyncSessionLocal, engine, get_db
+from fraud_detection import FraudDetectionRequest, detect_fraud, detect_fraud_many
+from model_registry import ModelsUnavailable
+from fraud_queue import scoring_worker
+from realtime import hub
+from rate_limit import check_bulk_sender, limiter, sender_limit
+from conversations import clear_unread, conversation_ids, lower_unread, peer_of, record_messages, unread_count
+from user_directory import directory
+from search_index import search_available, search_message_ids
+import archive
+from utils.logs import log_event
+from utils.serialization import FastJSONResponse, dumps
+from utils.pagination import decode_rank_cursor, encode_rank_cursor, keyset_filter, set_page_headers
 import logging
 
 router = APIRouter()
@@ -19,14 +39,118 @@ def normalize_phone(phone: str) -> str:
         return phone
     cleaned = ''.join(filter(str.isdigit, phone.strip()))
     normalized = f"+{cleaned}" if not phone.startswith('+') else phone
-    logger.info(f"Normalized phone: {phone} -> {normalized}")
+    logger.debug("Normalized phone: %s -> %s", phone, normalized)
     return normalized
 
+# Read paths select just these columns; rows are turned into dicts directly
+# instead of ORM objects validated through MessageOut
+_MESSAGE_COLUMNS = (
+    Message.id, Message.sender_id, Message.receiver_id, Message.content, Message.timestamp,
+    Message.is_fraudulent, Message.fraud_probability, Message.fraud_status, Message.conversation_id, Message.read,
+)
+
+_PAGE_HEADERS = ("X-Next-Cursor", "X-Has-More")
+
+def _message_dict(row, users: dict) -> dict:
+    """MessageOut-shaped dict from a _MESSAGE_COLUMNS row and its participants' UserRecords."""
+    sender = users[row.sender_id]
+    receiver = users[row.receiver_id]
+    return {
+        "id": row.id,
+        "sender_id": row.sender_id,
+        "receiver_id": row.receiver_id,
+        "content": row.content,
+        "timestamp": row.timestamp,
+        "sender_username": sender.username,
+        "receiver_username": receiver.username,
+        "sender_phone": sender.phone,
+        "receiver_phone": receiver.phone,
+        "is_fraudulent": bool(row.is_fraudulent),
+        "fraud_probability": row.fraud_probability,
+        "fraud_status": row.fraud_status,
+        "conversation_id": row.conversation_id,
+    }
+
+def _json_page(response: Response, content) -> FastJSONResponse:
+    # Headers set on the injected response are dropped when a Response is returned
+    return FastJSONResponse(
+        content, headers={name: response.headers[name] for name in _PAGE_HEADERS if name in response.headers}
+    )
+
+async def _participants(db: AsyncSession, messages) -> dict:
+    # A page usually involves a handful of users, mostly already cached
+    return await directory.many_by_id(db, {uid for msg in messages for uid in (msg.sender_id, msg.receiver_id)})
+
+async def _mark_read(db: AsyncSession, user_id: int, messages) -> int:
+    """Mark received messages read and lower the matching unread counters.
+
+    Where the database supports UPDATE ... RETURNING, one UPDATE flips the
+    page's unread rows; elsewhere it takes one per conversation so rowcount
+    can be attributed. One more statement lowers the counters.
+    """
+    # Archived messages are read-only
+    unread = [msg for msg in messages if not msg.read and not isinstance(msg, archive.ArchivedMessage)]
+    if not unread:
+        return 0
+    # Only rows still unread count, so concurrent readers never double-decrement
+    if engine.dialect.update_returning:
+        marked = (await db.execute(
+            update(Message).where(
+                Message.id.in_([msg.id for msg in unread]), Message.receiver_id == user_id,
+                Message.read == False  # noqa: E712
+            ).values(read=True).returning(Message.conversation_id, Message.sender_id, Message.receiver_id),
+            execution_options={"synchronize_session": False}
+        )).all()
+    else:
+        by_conversation = {}
+        for msg in unread:
+            by_conversation.setdefault(msg.conversation_id, []).append(msg)
+        marked = []
+        for group in by_conversation.values():
+            result = await db.execute(
+                update(Message).where(
+                    Message.id.in_([msg.id for msg in group]), Message.receiver_id == user_id,
+                    Message.read == False  # noqa: E712
+                ).values(read=True),
+                execution_options={"synchronize_session": False}
+            )
+            marked += [(group[0].conversation_id, group[0].sender_id, group[0].receiver_id)] * result.rowcount
+    await lower_unread(db, marked)
+    return len(marked)
+
+async def _fetch_page(db: AsyncSession, user_id: int, owner, response: Response, limit: int, before, after, since):
+    """Fetch one keyset page of ``user_id``'s messages and set the cursor headers.
+
+    ``owner(table)`` filters rows of the hot table and of the archive
+    partitions alike; the archive is only read when the page runs past
+    the hot rows, and only the partitions holding ``user_id``'s rows
+    (see archive.py).
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use apenas um de 'before' ou 'after'")
+    descending = after is None and since is None
+    try:
+        rows = []
+        if not descending:
+            # Oldest first: archived rows sort before every hot row
+            rows = await archive.fetch_page(db, user_id, owner, limit + 1, before=before, after=after, since=since)
+        if len(rows) <= limit:
+            query = keyset_filter(
+                select(*_MESSAGE_COLUMNS).where(owner(Message.__table__)),
+                Message.timestamp, Message.id, before=before, after=after, since=since
+            )
+            rows += (await db.execute(query.limit(limit + 1 - len(rows)))).all()
+        if descending and len(rows) <= limit:
+            rows += await archive.fetch_page(db, user_id, owner, limit + 1 - len(rows), before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return set_page_headers(response, rows, limit)
+
 @router.post("/send", response_model=MessageOut)
 async def send_message(
         msg: MessageCreate,
-        db: Session = Depends(get_db),
-        user_id: int = Depends(get_current_user)
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(sender_limit)
 ):
     try:
         normalized_phone = normalize_phone(msg.receiver_phone)
@@ -34,21 +158,26 @@ async def send_message(
             logger.error("Invalid phone number provided")
             raise HTTPException(status_code=400, detail="Número de telefone inválido")
 
-        receiver = db.query(User).filter_by(phone=normalized_phone).first()
+        receiver = await directory.by_phone(db, normalized_phone)
         if not receiver:
-            logger.error(f"User not found for phone: {normalized_phone}")
+            logger.error("User not found for phone: %s", normalized_phone)
             raise HTTPException(status_code=404, detail="Destinatário não encontrado")
         if receiver.id == user_id:
             logger.error("Attempt to send message to self")
             raise HTTPException(status_code=400, detail="Não pode enviar mensagem para si mesmo")
 
-        sender = db.query(User).filter_by(id=user_id).first()
+        sender = await directory.by_id(db, user_id)
         if not sender:
-            logger.error(f"Sender not found: {user_id}")
+            logger.error("Sender not found: %s", user_id)
             raise HTTPException(status_code=404, detail="Remetente não encontrado")
 
-        # Check for fraud
-        fraud_result = await detect_fraud(FraudDetectionRequest(content=msg.content))
+        deferred = config.FRAUD_SCORING_MODE == "async"
+        if deferred:
+            # Acknowledge now; the queue worker scores the message later
+            fraud_result = {"is_fraudulent": False, "fraud_probability": 0.0}
+        else:
+            fraud_result = await detect_fraud(FraudDetectionRequest(content=msg.content))
+            limiter.record_fraud(user_id, fraud_result["fraud_probability"])
 
         message = Message(
             sender_id=user_id,
@@ -56,61 +185,440 @@ async def send_message(
             content=msg.content,
             read=False,
             is_fraudulent=fraud_result["is_fraudulent"],
-            fraud_probability=fraud_result["fraud_probability"]
+            fraud_probability=fraud_result["fraud_probability"],
+            fraud_status="pending" if deferred else "scored",
+            conversation_id=(await conversation_ids(db, user_id, [receiver.id]))[receiver.id]
         )
         db.add(message)
-        db.commit()
-        db.refresh(message)
+        await db.flush()
+        if deferred:
+            db.add(FraudScoringJob(message_id=message.id))
+        await record_messages(
+            db, [(message.conversation_id, message.id, message.timestamp, user_id, receiver.id)]
+        )
+        await db.commit()
+        if deferred:
+            scoring_worker.notify()
 
         message.sender_username = sender.username
         message.receiver_username = receiver.username
         message.sender_phone = sender.phone
         message.receiver_phone = receiver.phone
+        result = MessageOut.model_validate(message)
+
+        # Push to the receiver's open WebSocket connections
+        hub.publish(receiver.id, {"type": "message", "data": result.model_dump(mode="json")})
 
-        logger.info(f"Message sent successfully: {message.id}")
-        return message
+        log_event(logger, logging.INFO, "message_sent", sample_rate=config.LOG_SAMPLE_RATE,
+                  message_id=message.id, sender_id=user_id, receiver_id=receiver.id)
+        return result
+    except HTTPException:
+        raise
+    except ModelsUnavailable:
+        raise HTTPException(status_code=503, detail="Detecção de fraude indisponível")
     except Exception as e:
-        logger.error(f"Error sending message: {str(e)}")
+        logger.error("Error sending message: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao enviar mensagem: {str(e)}")
 
+@router.post("/send_bulk", response_model=list[BulkSendResult])
+async def send_bulk(
+        bulk: BulkMessageCreate,
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
+    """Fan one notice (or per-recipient contents) out to many phones.
+
+    Phones are resolved with one IN query, each distinct content is scored
+    once and all messages are written with one bulk insert in one transaction.
+    Results come back in request order, one per recipient.
+    """
+    if not bulk.recipients:
+        raise HTTPException(status_code=400, detail="Lista de destinatários vazia")
+    if len(bulk.recipients) > config.BULK_SEND_MAX_RECIPIENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {config.BULK_SEND_MAX_RECIPIENTS} destinatários por envio"
+        )
+    # One token per recipient, charged before any DB or model work
+    await check_bulk_sender(user_id, len(bulk.recipients))
+    try:
+        sender = await directory.by_id(db, user_id)
+        if not sender:
+            logger.error("Sender not found: %s", user_id)
+            raise HTTPException(status_code=404, detail="Remetente não encontrado")
+
+        phones = [normalize_phone(recipient.receiver_phone) for recipient in bulk.recipients]
+        receivers = await directory.many_by_phone(db, [phone for phone in phones if phone])
+
+        results = [BulkSendResult(receiver_phone=recipient.receiver_phone, status="sent") for recipient in bulk.recipients]
+        deliveries = []
+        for result, recipient, phone in zip(results, bulk.recipients, phones):
+            content = recipient.content if recipient.content is not None else bulk.content
+            receiver = receivers.get(phone) if phone else None
+            if not phone:
+                result.status = "invalid_phone"
+            elif receiver is None:
+                result.status = "not_found"
+            elif receiver.id == user_id:
+                result.status = "self"
+            elif content is None:
+                result.status = "missing_content"
+            else:
+                deliveries.append((result, receiver, content))
+
+        if deliveries:
+            deferred = config.FRAUD_SCORING_MODE == "async"
+            if deferred:
+                fraud_results = [{"is_fraudulent": False, "fraud_probability": 0.0}] * len(deliveries)
+            else:
+                # Distinct contents are scored once, so a broadcast costs one inference
+                fraud_results = await detect_fraud_many([content for _, _, content in deliveries])
+                # Once per request, so a broadcast weighs like a single message
+                limiter.record_fraud(user_id, max(result["fraud_probability"] for result in fraud_results))
+
+            conversations = await conversation_ids(db, user_id, [receiver.id for _, receiver, _ in deliveries])
+            timestamp = datetime.utcnow()
+            rows = [
+                {
+                    "sender_id": user_id,
+                    "receiver_id": receiver.id,
+                    "content": content,
+                    "timestamp": timestamp,
+                    "read": False,
+                    "is_fraudulent": fraud_result["is_fraudulent"],
+                    "fraud_probability": fraud_result["fraud_probability"],
+                    "fraud_status": "pending" if deferred else "scored",
+                    "conversation_id": conversations[receiver.id],
+                }
+                for (_, receiver, content), fraud_result in zip(deliveries, fraud_results)
+            ]
+            # sort_by_parameter_order would make SQLite insert row by row, so
+            # map the returned ids back by (receiver, content) instead; rows
+            # sharing that key are interchangeable
+            inserted = await db.execute(insert(Message).returning(Message.id, Message.receiver_id, Message.content), rows)
+            ids_by_key = {}
+            for message_id, receiver_id, content in sorted(inserted):
+                ids_by_key.setdefault((receiver_id, content), []).append(message_id)
+            message_ids = [ids_by_key[(row["receiver_id"], row["content"])].pop(0) for row in rows]
+            if deferred:
+                await db.execute(insert(FraudScoringJob), [
+                    {"message_id": message_id, "enqueued_at": timestamp} for message_id in message_ids
+                ])
+            await record_messages(db, [
+                (row["conversation_id"], message_id, timestamp, user_id, row["receiver_id"])
+                for row, message_id in zip(rows, message_ids)
+            ])
+            await db.commit()
+            if deferred:
+                scoring_worker.notify()
+
+            for (result, receiver, _), row, message_id in zip(deliveries, rows, message_ids):
+                result.message = MessageOut(
+                    id=message_id,
+                    sender_username=sender.username,
+                    receiver_username=receiver.username,
+                    sender_phone=sender.phone,
+                    receiver_phone=receiver.phone,
+                    **row
+                )
+                hub.publish(receiver.id, {"type": "message", "data": result.message.model_dump(mode="json")})
+
+        log_event(logger, logging.INFO, "bulk_sent", sample_rate=config.LOG_SAMPLE_RATE,
+                  sender_id=user_id, recipients=len(results), sent=len(deliveries))
+        return results
+    except HTTPException:
+        raise
+    except ModelsUnavailable:
+        raise HTTPException(status_code=503, detail="Detecção de fraude indisponível")
+    except Exception as e:
+        logger.error("Error sending bulk message: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao enviar mensagens: {str(e)}")
+
 @router.get("/inbox", response_model=list[MessageOut])
-async def get_inbox(db: Session = Depends(get_db), user_id: int = Depends(get_current_user)):
+async def get_inbox(
+        response: Response,
+        limit: int = Query(50, ge=1, le=200),
+        before: Optional[str] = Query(None, description="Cursor: mensagens mais antigas"),
+        after: Optional[str] = Query(None, description="Cursor: mensagens mais recentes"),
+        since: Optional[datetime] = Query(None, description="Apenas mensagens após este instante"),
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
     try:
-        messages = db.query(Message).filter(Message.receiver_id == user_id).all()
-
-        for msg in messages:
-            sender = db.query(User).filter_by(id=msg.sender_id).first()
-            msg.sender_username = sender.username
-            msg.sender_phone = sender.phone
-            receiver = db.query(User).filter_by(id=user_id).first()
-            msg.receiver_username = receiver.username
-            msg.receiver_phone = receiver.phone
-            # Mark as read
-            if not msg.read:
-                msg.read = True
-                db.commit()
-
-        logger.info(f"Inbox fetched for user {user_id}")
-        return messages
+        messages = await _fetch_page(
+            db, user_id, lambda table: table.c.receiver_id == user_id, response, limit, before, after, since
+        )
+        users = await _participants(db, messages)
+        result = [_message_dict(row, users) for row in messages]
+
+        # Flip the page's unread rows and lower their conversations' counters
+        marked_read = await _mark_read(db, user_id, messages)
+        if marked_read:
+            await db.commit()
+
+        log_event(logger, logging.INFO, "inbox_fetched", sample_rate=config.LOG_SAMPLE_RATE,
+                  user_id=user_id, count=len(result), marked_read=marked_read)
+        return _json_page(response, result)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching inbox: {str(e)}")
+        logger.error("Error fetching inbox: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar inbox: {str(e)}")
 
 @router.get("/sent", response_model=list[MessageOut])
-async def get_sent_messages(db: Session = Depends(get_db), user_id: int = Depends(get_current_user)):
+async def get_sent_messages(
+        response: Response,
+        limit: int = Query(50, ge=1, le=200),
+        before: Optional[str] = Query(None, description="Cursor: mensagens mais antigas"),
+        after: Optional[str] = Query(None, description="Cursor: mensagens mais recentes"),
+        since: Optional[datetime] = Query(None, description="Apenas mensagens após este instante"),
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
+    try:
+        messages = await _fetch_page(
+            db, user_id, lambda table: table.c.sender_id == user_id, response, limit, before, after, since
+        )
+
+        log_event(logger, logging.INFO, "sent_fetched", sample_rate=config.LOG_SAMPLE_RATE,
+                  user_id=user_id, count=len(messages))
+        users = await _participants(db, messages)
+        return _json_page(response, [_message_dict(row, users) for row in messages])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching sent messages: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar mensagens enviadas: {str(e)}")
+
+@router.get("/search", response_model=list[MessageOut])
+async def search_messages(
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200, description="Termos de busca"),
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Cursor: próxima página de resultados"),
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
+    """Messages the caller sent or received that match ``q``, best match first."""
+    if not search_available(engine.dialect.name):
+        raise HTTPException(status_code=501, detail="Busca indisponível neste banco de dados")
+    try:
+        try:
+            after = decode_rank_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        hits = await search_message_ids(db, user_id, q, limit + 1, after)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+        if hits:
+            response.headers["X-Next-Cursor"] = encode_rank_cursor(hits[-1][1], hits[-1][0])
+        response.headers["X-Has-More"] = "true" if has_more else "false"
+
+        by_id = {row.id: row for row in await db.execute(select(*_MESSAGE_COLUMNS).where(Message.id.in_([id for id, _ in hits])))}
+        messages = [by_id[id] for id, _ in hits if id in by_id]
+        users = await _participants(db, messages)
+        return _json_page(response, [_message_dict(row, users) for row in messages])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error searching messages: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar mensagens: {str(e)}")
+
+async def _export_lines(user_id: int):
+    """Yield the user's messages, oldest first, as NDJSON chunks.
+
+    Rows come from server-side cursors in EXPORT_BATCH_SIZE batches, the
+    archive partitions first and then the hot table, so memory stays flat
+    however long the history is. The request's session may be closed
+    before streaming starts, so this opens its own; user lookups get a
+    second one because an open streaming cursor may not share its connection.
+    """
+    def owner(table):
+        return or_(table.c.sender_id == user_id, table.c.receiver_id == user_id)
+
+    async def hot_batches(db):
+        rows = await db.stream(
+            select(*_MESSAGE_COLUMNS)
+            .where(owner(Message.__table__))
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .execution_options(yield_per=config.EXPORT_BATCH_SIZE)
+        )
+        async for batch in rows.partitions():
+            yield batch
+
+    exported = 0
+    async with AsyncSessionLocal() as stream_db, AsyncSessionLocal() as lookup_db:
+        for batches in (archive.stream_batches(stream_db, user_id, owner), hot_batches(stream_db)):
+            async for batch in batches:
+                users = await _participants(lookup_db, batch)
+                yield b"".join(dumps(_message_dict(row, users)) + b"\n" for row in batch)
+                exported += len(batch)
+    log_event(logger, logging.INFO, "messages_exported", user_id=user_id, count=exported)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_messages(user_id: int = Depends(get_current_user)):
+    """Every message the caller sent or received, as newline-delimited JSON."""
+    return StreamingResponse(
+        _export_lines(user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="messages.ndjson"'}
+    )
+
+@router.get("/conversations", response_model=list[ConversationOut])
+async def list_conversations(
+        response: Response,
+        limit: int = Query(50, ge=1, le=200),
+        before: Optional[str] = Query(None, description="Cursor: conversas menos recentes"),
+        after: Optional[str] = Query(None, description="Cursor: conversas atualizadas depois"),
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
+    """The caller's conversations, most recently active first."""
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use apenas um de 'before' ou 'after'")
+    try:
+        query = select(Conversation).where(
+            or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+        )
+        try:
+            query = keyset_filter(query, Conversation.last_message_at, Conversation.id, before=before, after=after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        rows = (await db.scalars(query.limit(limit + 1))).all()
+        page = set_page_headers(response, rows, limit, timestamp_attr="last_message_at")
+
+        peers = await directory.many_by_id(db, {peer_of(conversation, user_id) for conversation in page})
+        last_messages = {}
+        if page:
+            last_messages = {row.id: row for row in await db.execute(
+                select(Message.id, Message.content, Message.sender_id)
+                .where(Message.id.in_([conversation.last_message_id for conversation in page]))
+            )}
+            missing = [
+                (conversation.last_message_id, conversation.last_message_at)
+                for conversation in page if conversation.last_message_id not in last_messages
+            ]
+            if missing:
+                # Quiet conversations may point at an archived message
+                last_messages.update(await archive.fetch_by_ids(db, missing))
+        result = []
+        for conversation in page:
+            peer = peers[peer_of(conversation, user_id)]
+            last = last_messages.get(conversation.last_message_id)
+            result.append(ConversationOut(
+                id=conversation.id,
+                peer_id=peer.id,
+                peer_username=peer.username,
+                peer_phone=peer.phone,
+                last_message_id=conversation.last_message_id,
+                last_message_at=conversation.last_message_at,
+                last_message_content=last.content if last else None,
+                last_message_sender_id=last.sender_id if last else None,
+                unread_count=unread_count(conversation, user_id)
+            ))
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error listing conversations: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar conversas: {str(e)}")
+
+@router.get("/conversations/{conversation_id}", response_model=list[MessageOut])
+async def get_conversation_messages(
+        conversation_id: int,
+        response: Response,
+        limit: int = Query(50, ge=1, le=200),
+        before: Optional[str] = Query(None, description="Cursor: mensagens mais antigas"),
+        after: Optional[str] = Query(None, description="Cursor: mensagens mais recentes"),
+        since: Optional[datetime] = Query(None, description="Apenas mensagens após este instante"),
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
     try:
-        messages = db.query(Message).filter(Message.sender_id == user_id).all()
-
-        for msg in messages:
-            receiver = db.query(User).filter_by(id=msg.receiver_id).first()
-            sender = db.query(User).filter_by(id=user_id).first()
-            msg.sender_username = sender.username
-            msg.sender_phone = sender.phone
-            msg.receiver_username = receiver.username
-            msg.receiver_phone = receiver.phone
-
-        logger.info(f"Sent messages fetched for user {user_id}")
-        return messages
+        conversation = await db.get(Conversation, conversation_id)
+        if conversation is None or user_id not in (conversation.user_low_id, conversation.user_high_id):
+            raise HTTPException(status_code=404, detail="Conversa não encontrada")
+
+        messages = await _fetch_page(
+            db, user_id, lambda table: table.c.conversation_id == conversation_id, response, limit, before, after, since
+        )
+        users = await _participants(db, messages)
+        return _json_page(response, [_message_dict(row, users) for row in messages])
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching sent messages: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao buscar mensagens enviadas: {str(e)}")
\ No newline at end of file
+        logger.error("Error fetching conversation: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar conversa: {str(e)}")
+
+@router.post("/conversations/read")
+async def mark_conversations_read(
+        request: ConversationReadRequest,
+        db: AsyncSession = Depends(get_db),
+        user_id: int = Depends(get_current_user)
+):
+    """Mark everything the caller received in these conversations as read."""
+    try:
+        conversation_ids = set(request.conversation_ids)
+        if not conversation_ids:
+            return {"marked_read": 0}
+        marked = await db.execute(
+            update(Message)
+            .where(
+                Message.conversation_id.in_(conversation_ids),
+                Message.receiver_id == user_id,
+                Message.read == False  # noqa: E712
+            )
+            .values(read=True),
+            execution_options={"synchronize_session": False}
+        )
+        await clear_unread(db, user_id, conversation_ids)
+        await db.commit()
+        return {"marked_read": marked.rowcount}
+    except Exception as e:
+        logger.error("Error marking conversations read: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao marcar conversas como lidas: {str(e)}")
+
+@router.websocket("/ws")
+async def messages_ws(websocket: WebSocket, token: Optional[str] = Query(None)):
+    # Browsers cannot set headers on WebSocket requests, so accept ?token= too
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    try:
+        user_id = verify_token(token) if token else None
+    except Exception:
+        user_id = None
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = hub.subscribe(user_id)
+
+    async def pump():
+        while not subscription.overflowed:
+            event = await subscription.queue.get()
+            if subscription.overflowed:
+                break
+            await websocket.send_json(event)
+        # Too far behind: the client must resync through /inbox?after=
+        await websocket.close(code=1013)
+
+    async def drain():
+        # Incoming frames are ignored; this only notices disconnects
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        hub.unsubscribe(subscription)
+        logger.info("WebSocket closed for user %s", user_id)
@@ -1,9 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
 from schemas import UserCreate, UserLogin, Token
-from utils.security import hash_password, verify_password, create_access_token
-from auth import get_db, get_current_user
+from utils.security import (
+    PasswordHasherBusy, create_access_token, hash_password_async, needs_rehash, verify_password_async
+)
+from auth import get_current_user
+from database import get_db
+from user_directory import UserRecord, directory
+from rate_limit import ip_limit
+from utils.logs import log_event
+import config
 import logging
 
 router = APIRouter()
@@ -12,89 +20,116 @@ router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@router.post("/register")
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+def _busy() -> HTTPException:
+    logger.warning("Password hashing queue full, rejecting request")
+    return HTTPException(status_code=429, detail="Servidor ocupado, tente novamente", headers={"Retry-After": "1"})
+
+@router.post("/register", dependencies=[Depends(ip_limit("register"))])
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        if db.query(User).filter_by(username=user.username).first():
-            logger.error(f"Username already in use: {user.username}")
+        if await directory.by_username(db, user.username):
+            logger.error("Username already in use: %s", user.username)
             raise HTTPException(status_code=400, detail="Username já em uso")
-        if db.query(User).filter_by(phone=user.phone).first():
-            logger.error(f"Phone number already registered: {user.phone}")
+        if await directory.by_phone(db, user.phone):
+            logger.error("Phone number already registered: %s", user.phone)
             raise HTTPException(status_code=400, detail="Número de celular já registrado")
 
-        hashed = hash_password(user.password)
+        hashed = await hash_password_async(user.password)
         db_user = User(
             username=user.username,
             phone=user.phone,
             password=hashed
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        logger.info(f"User registered successfully: {user.username}")
+        await db.commit()
+        directory.add(UserRecord(db_user.id, db_user.username, db_user.phone, db_user.password))
+        logger.info("User registered successfully: %s", user.username)
         return {"msg": "Usuário registrado com sucesso"}
+    except HTTPException:
+        raise
+    except PasswordHasherBusy:
+        raise _busy()
     except Exception as e:
-        logger.error(f"Error registering user: {str(e)}")
+        logger.error("Error registering user: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao registrar usuário: {str(e)}")
 
-@router.post("/login", response_model=Token)
-async def login(data: UserLogin, db: Session = Depends(get_db)):
+@router.post("/login", response_model=Token, dependencies=[Depends(ip_limit("login"))])
+async def login(data: UserLogin, db: AsyncSession = Depends(get_db)):
     try:
-        user = db.query(User).filter_by(phone=data.phone).first()
-        if not user or not verify_password(data.password, user.password):
-            logger.error(f"Invalid credentials for phone: {data.phone}")
+        user = await directory.by_phone(db, data.phone)
+        if not user or not await verify_password_async(data.password, user.password):
+            logger.error("Invalid credentials for phone: %s", data.phone)
             raise HTTPException(status_code=401, detail="Credenciais inválidas")
 
+        # Upgrade hashes made with an old cost factor while we have the password
+        if needs_rehash(user.password):
+            try:
+                await db.execute(
+                    update(User).where(User.id == user.id).values(password=await hash_password_async(data.password))
+                )
+                await db.commit()
+                directory.invalidate(user_id=user.id)
+            except PasswordHasherBusy:
+                pass
+
         token = create_access_token({"user_id": user.id, "sub": user.username})
-        logger.info(f"User logged in successfully: {user.username}, token: {token[:10]}...")
+        log_event(logger, logging.INFO, "login", sample_rate=config.LOG_SAMPLE_RATE, user_id=user.id)
         return {
             "access_token": token,
             "token_type": "bearer",
             "user_id": user.id,
             "username": user.username
         }
+    except HTTPException:
+        raise
+    except PasswordHasherBusy:
+        raise _busy()
     except Exception as e:
-        logger.error(f"Error logging in: {str(e)}")
+        logger.error("Error logging in: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao fazer login: {str(e)}")
 
 @router.get("/find")
 async def find_user_by_contact(
         contact: str = Query(..., description="Número de telefone do usuário"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = db.query(User).filter(User.phone == contact).first()
+        user = await directory.by_phone(db, contact)
         if not user:
-            logger.error(f"User not found for contact: {contact}")
+            logger.error("User not found for contact: %s", contact)
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-        logger.info(f"User found: {user.username}")
+        log_event(logger, logging.INFO, "user_found", sample_rate=config.LOG_SAMPLE_RATE, user_id=user.id)
         return {
             "id": user.id,
             "username": user.username,
             "phone": user.phone
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error finding user: {str(e)}")
+        logger.error("Error finding user: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar usuário: {str(e)}")
 
 @router.get("/me")
 async def get_current_user_profile(
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = db.query(User).filter_by(id=user_id).first()
+        user = await directory.by_id(db, user_id)
         if not user:
-            logger.error(f"Current user not found: {user_id}")
+            logger.error("Current user not found: %s", user_id)
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-        logger.info(f"Profile fetched for user: {user.username}")
+        log_event(logger, logging.INFO, "profile_fetched", sample_rate=config.LOG_SAMPLE_RATE, user_id=user.id)
         return {
             "id": user.id,
             "username": user.username,
             "phone": user.phone
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching user profile: {str(e)}")
+        logger.error("Error fetching user profile: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar perfil: {str(e)}")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, confloat, constr
 from datetime import datetime
 from typing import Optional
 
@@ -33,6 +33,44 @@ class MessageOut(BaseModel):
     receiver_phone: Optional[str] = None
     is_fraudulent: bool = False
     fraud_probability: float = 0.0
+    fraud_status: str = "scored"
+    conversation_id: Optional[int] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BulkRecipient(BaseModel):
+    receiver_phone: str
+    # Falls back to BulkMessageCreate.content when omitted
+    content: Optional[str] = None
+
+class BulkMessageCreate(BaseModel):
+    recipients: list[BulkRecipient]
+    content: Optional[str] = None
+
+class BulkSendResult(BaseModel):
+    receiver_phone: str
+    # "sent", "invalid_phone", "not_found", "self" or "missing_content"
+    status: str
+    message: Optional[MessageOut] = None
+
+class ConversationOut(BaseModel):
+    id: int
+    peer_id: int
+    peer_username: str
+    peer_phone: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_message_at: Optional[datetime] = None
+    last_message_content: Optional[str] = None
+    last_message_sender_id: Optional[int] = None
+    unread_count: int = 0
+
+class ConversationReadRequest(BaseModel):
+    conversation_ids: list[int]
+
+class CandidateModelRequest(BaseModel):
+    # Omitted paths keep the live model's file
+    text_path: Optional[str] = None
+    url_path: Optional[str] = None
+    # Fraction of scoring batches also scored by the candidate
+    shadow_rate: confloat(ge=0.0, le=1.0) = 0.0
@@ -0,0 +1,116 @@
+"""SQLite FTS5 index over message content.
+
+``messages_fts`` is contentless: it stores only the postings for each
+message body plus a ``participants`` column holding ``u<sender> u<receiver>``.
+Queries match the terms *and* the caller's participant token, so FTS5
+intersects the two posting lists instead of filtering matches afterwards.
+Triggers keep the index in step with inserts, updates and deletes.
+
+Run ``python search_index.py --rebuild`` to rebuild it from scratch.
+"""
+import re
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_PARTICIPANTS_NEW = "'u' || new.sender_id || ' u' || new.receiver_id"
+_PARTICIPANTS_OLD = "'u' || old.sender_id || ' u' || old.receiver_id"
+
+_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "body, participants, content='', tokenize='unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, body, participants) VALUES (new.id, new.content, {_PARTICIPANTS_NEW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, body, participants)
+        VALUES ('delete', old.id, old.content, {_PARTICIPANTS_OLD});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, sender_id, receiver_id ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, body, participants)
+        VALUES ('delete', old.id, old.content, {_PARTICIPANTS_OLD});
+        INSERT INTO messages_fts(rowid, body, participants) VALUES (new.id, new.content, {_PARTICIPANTS_NEW});
+    END""",
+    # Rank by the body only; the participants column is just a filter
+    "INSERT INTO messages_fts(messages_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+]
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def search_available(dialect_name: str) -> bool:
+    return dialect_name == "sqlite"
+
+
+def rebuild_search_index(conn):
+    """Re-index every message (sync connection)."""
+    conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')"))
+    conn.execute(text(
+        "INSERT INTO messages_fts(rowid, body, participants) "
+        "SELECT id, content, 'u' || sender_id || ' u' || receiver_id FROM messages"
+    ))
+
+
+def create_search_index(conn):
+    """Migration: create the index and triggers, backfilling on first run."""
+    if not search_available(conn.dialect.name):
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")).first()
+    for statement in _DDL:
+        conn.execute(text(statement))
+    if exists is None:
+        rebuild_search_index(conn)
+
+
+def match_expression(query: str, user_id: int):
+    """Build an FTS5 MATCH string, or None when ``query`` has no terms.
+
+    Every term is quoted so user input cannot inject FTS5 syntax; the last
+    one is a prefix so results follow the user as they type.
+    """
+    terms = _TOKEN.findall(query)
+    if not terms:
+        return None
+    body = " ".join(f'"{term}"' for term in terms) + "*"
+    return f'body:({body}) AND participants:"u{user_id}"'
+
+
+async def search_message_ids(db: AsyncSession, user_id: int, query: str, limit: int, after=None):
+    """Return [(message_id, rank)] best first; ``after`` is the last (rank, id) seen."""
+    match = match_expression(query, user_id)
+    if match is None:
+        return []
+    params = {"match": match, "limit": limit}
+    keyset = ""
+    if after is not None:
+        params["rank"], params["id"] = after
+        keyset = "AND (rank > :rank OR (rank = :rank AND rowid > :id))"
+    rows = await db.execute(
+        text(
+            f"SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH :match {keyset} "
+            "ORDER BY rank, rowid LIMIT :limit"
+        ),
+        params,
+    )
+    return [(row[0], row[1]) for row in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Manage the message search index")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every message")
+    args = parser.parse_args()
+
+    async def main():
+        from database import engine
+        async with engine.begin() as conn:
+            if not search_available(conn.dialect.name):
+                raise SystemExit("Search index requires SQLite with FTS5")
+            await conn.run_sync(create_search_index)
+            if args.rebuild:
+                await conn.run_sync(rebuild_search_index)
+        await engine.dispose()
+
+    asyncio.run(main())
+    print("Search index rebuilt." if args.rebuild else "Search index ready.")
@@ -1,54 +1,53 @@
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
 import pandas as pd
 import numpy as np
-import re
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold, cross_validate, train_test_split
 from sklearn.pipeline import Pipeline
 import joblib
-import nltk
-
-# Download required NLTK resources
-try:
-    nltk.download('punkt_tab', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except Exception as e:
-    print(f"Error downloading NLTK resources: {e}")
-    exit(1)
-
-# Load datasets
-try:
-    sms_data = pd.read_csv('sms_spam.csv', encoding='latin-1')
-    sms_data = sms_data.rename(columns={'v1': 'label', 'v2': 'text'})
-except FileNotFoundError:
-    print("Error: sms_spam.csv not found. Please provide the SMS Spam Collection Dataset.")
-    exit(1)
-
-try:
-    url_data = pd.read_csv('phishing_urls.csv', encoding='latin-1')
-except FileNotFoundError:
-    print("Error: phishing_urls.csv not found. Please provide the UCI Phishing Sites Dataset.")
-    exit(1)
-
-# Debug: Print column names
-print("Columns in phishing_urls.csv:", url_data.columns.tolist())
-
-# Preprocess text
-def clean_text(text):
-    if not isinstance(text, str):
-        return ''
-    text = text.lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    text = re.sub(r'http\S+', '', text)
-    words = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    filtered_words = [word for word in words if word not in stop_words]
-    stemmer = PorterStemmer()
-    stemmed_words = [stemmer.stem(word) for word in filtered_words]
-    return ' '.join(stemmed_words)
+import config
+from compact_model import CompactTextModel
+from preprocessing import PREPROCESSING_VERSION, TextPreprocessor
+
+URL_FEATURES = ['length', 'num_subdomains', 'has_https', 'has_suspicious_words']
+COMPACT_N_FEATURES = 2 ** 18
+
+# Bounded search spaces: small enough to finish in seconds on a laptop.
+# Random forests are fitted single-threaded inside cross-validation (the
+# folds already use every core) and always served with n_jobs=1.
+TEXT_CANDIDATES = [
+    ('RandomForest n=100', 'pkl', lambda: Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=5000)),
+        ('clf', RandomForestClassifier(n_estimators=100, random_state=42)),
+    ])),
+    ('RandomForest n=50 depth=40', 'pkl', lambda: Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=5000)),
+        ('clf', RandomForestClassifier(n_estimators=50, max_depth=40, random_state=42)),
+    ])),
+    *[
+        (f'Hashing+Logistic C={c:g}', 'npz', lambda c=c: Pipeline([
+            ('hash', CompactTextModel.make_vectorizer(COMPACT_N_FEATURES)),
+            ('clf', LogisticRegression(C=c, max_iter=1000, class_weight='balanced')),
+        ]))
+        for c in (1.0, 10.0, 30.0)
+    ],
+]
+
+URL_CANDIDATES = [
+    (f'RandomForest n={n} depth={depth}', 'pkl', lambda n=n, depth=depth: Pipeline([
+        ('clf', RandomForestClassifier(n_estimators=n, max_depth=depth, random_state=42)),
+    ]))
+    for n in (50, 100) for depth in (None, 12)
+]
+
 
 # Extract URL features (for backend compatibility)
 def extract_url_features(url):
@@ -61,41 +60,190 @@ def extract_url_features(url):
         'has_suspicious_words': 1 if any(word in url.lower() for word in ['login', 'verify', 'account', 'secure']) else 0
     }
 
-# Prepare message data
-sms_data['clean_text'] = sms_data['text'].apply(clean_text)
-sms_data['label'] = sms_data['label'].map({'ham': 0, 'spam': 1})
-
-# Prepare URL data (use existing features)
-# Map dataset columns to expected features
-url_data = url_data.rename(columns={
-    'LongURL': 'length',
-    'SubDomains': 'num_subdomains',
-    'HTTPS': 'has_https'
-})
-# Add has_suspicious_words (simplified, as we don't have raw URLs)
-url_data['has_suspicious_words'] = 0  # Assume 0 if no raw URLs available; adjust if URLs are present
-
-# Train message classifier
-X_text = sms_data['clean_text']
-y_text = sms_data['label']
-text_pipeline = Pipeline([
-    ('tfidf', TfidfVectorizer(max_features=5000)),
-    ('clf', RandomForestClassifier(n_estimators=100, random_state=42))
-])
-X_train_text, X_test_text, y_train_text, y_test_text = train_test_split(X_text, y_text, test_size=0.2, random_state=42)
-text_pipeline.fit(X_train_text, y_train_text)
-
-# Train URL classifier
-X_url = url_data[['length', 'num_subdomains', 'has_https', 'has_suspicious_words']]
-y_url = url_data['class']
-url_pipeline = Pipeline([
-    ('clf', RandomForestClassifier(n_estimators=100, random_state=42))
-])
-X_train_url, X_test_url, y_train_url, y_test_url = train_test_split(X_url, y_url, test_size=0.2, random_state=42)
-url_pipeline.fit(X_train_url, y_train_url)
-
-# Save models
-joblib.dump(text_pipeline, 'text_fraud_model.pkl')
-joblib.dump(url_pipeline, 'url_fraud_model.pkl')
-
-print("Models trained and saved successfully.")
\ No newline at end of file
+
+def load_datasets(sms_path, url_path):
+    try:
+        sms_data = pd.read_csv(sms_path, encoding='latin-1')
+        sms_data = sms_data.rename(columns={'v1': 'label', 'v2': 'text'})
+    except FileNotFoundError:
+        sys.exit(f"Error: {sms_path} not found. Please provide the SMS Spam Collection Dataset.")
+    try:
+        url_data = pd.read_csv(url_path, encoding='latin-1')
+    except FileNotFoundError:
+        sys.exit(f"Error: {url_path} not found. Please provide the UCI Phishing Sites Dataset.")
+
+    sms_data['label'] = sms_data['label'].map({'ham': 0, 'spam': 1})
+    # Map dataset columns to expected features
+    url_data = url_data.rename(columns={
+        'LongURL': 'length',
+        'SubDomains': 'num_subdomains',
+        'HTTPS': 'has_https'
+    })
+    # The dataset has no raw URLs to look for suspicious words in
+    url_data['has_suspicious_words'] = 0
+    return sms_data, url_data
+
+
+def cached_clean_text(texts, preprocessor, cache_dir, n_jobs):
+    """Preprocess ``texts``, reusing the result from an earlier run when possible.
+
+    The cache key covers the raw texts, PREPROCESSING_VERSION and the
+    stopword list, so any change to the data or the cleaning logic misses.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{PREPROCESSING_VERSION}\0".encode())
+    digest.update("\0".join(sorted(preprocessor.stop_words)).encode())
+    for text in texts:
+        digest.update(b"\0" + str(text).encode())
+    path = os.path.join(cache_dir, f"clean_text_{digest.hexdigest()}.joblib")
+    if os.path.exists(path):
+        print(f"Using cached preprocessed text from {path}")
+        return joblib.load(path)
+    started = time.perf_counter()
+    cleaned = preprocessor.transform(texts, n_jobs=n_jobs)
+    os.makedirs(cache_dir, exist_ok=True)
+    joblib.dump(cleaned, path)
+    print(f"Preprocessed {len(cleaned)} texts in {time.perf_counter() - started:.1f}s (cached to {path})")
+    return cleaned
+
+
+def to_serving_model(fitted, kind):
+    """The object the app loads: a CompactTextModel or a single-threaded pipeline."""
+    if kind == 'npz':
+        return CompactTextModel.from_classifier(fitted.named_steps['clf'], COMPACT_N_FEATURES)
+    # Spreading one prediction over all cores costs more than it saves
+    fitted.set_params(clf__n_jobs=1)
+    return fitted
+
+
+def save_model(model, kind, path):
+    if kind == 'npz':
+        model.save(path)
+    else:
+        joblib.dump(model, path)
+
+
+def size_kb(model, kind):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"model.{kind}")
+        save_model(model, kind, path)
+        return os.path.getsize(path) / 1024
+
+
+def latency_ms(model, rows):
+    """Median latency of scoring one message, in milliseconds."""
+    timings = []
+    for i in range(min(200, len(rows))):
+        row = rows[i:i + 1]
+        started = time.perf_counter()
+        model.predict_proba(row)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def batch_us(model, rows):
+    """Per-message cost when all rows are scored in one call, in microseconds."""
+    started = time.perf_counter()
+    model.predict_proba(rows)
+    return (time.perf_counter() - started) / len(rows) * 1e6
+
+
+def search(name, candidates, X_train, y_train, X_test, y_test, cv, n_jobs, f1_tolerance):
+    """Cross-validate every candidate, then pick the cheapest one to serve among
+    those whose CV F1 is within ``f1_tolerance`` of the best."""
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+    results = []
+    for label, kind, build in candidates:
+        scores = cross_validate(build(), X_train, y_train, cv=folds, scoring='f1', n_jobs=n_jobs)
+        fitted = build()
+        if kind == 'pkl':
+            fitted.set_params(clf__n_jobs=n_jobs)
+        started = time.perf_counter()
+        fitted.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+        model = to_serving_model(fitted, kind)
+        classes = getattr(model, 'classes_', np.array([0, 1]))
+        predicted = classes[(model.predict_proba(X_test)[:, 1] > 0.5).astype(int)]
+        results.append({
+            'label': label, 'kind': kind, 'model': model,
+            'cv_f1': float(np.mean(scores['test_score'])), 'cv_f1_std': float(np.std(scores['test_score'])),
+            'fit_s': fit_seconds,
+            'accuracy': accuracy_score(y_test, predicted), 'f1': f1_score(y_test, predicted),
+            'latency_ms': latency_ms(model, X_test), 'batch_us': batch_us(model, X_test),
+            'size_kb': size_kb(model, kind),
+        })
+
+    best_f1 = max(result['cv_f1'] for result in results)
+    eligible = [result for result in results if result['cv_f1'] >= best_f1 - f1_tolerance]
+    chosen = min(eligible, key=lambda result: (result['latency_ms'], result['size_kb']))
+
+    print(f"\n{name} candidates ({cv}-fold CV on the training split, metrics on the held-out split)")
+    print(f"  {'model':<30}{'cv f1':>14}{'fit s':>8}{'accuracy':>10}{'f1':>8}"
+          f"{'1-msg ms':>10}{'batch us/msg':>14}{'size KB':>10}")
+    for result in results:
+        marker = '*' if result is chosen else ' '
+        print(f"{marker} {result['label']:<30}{result['cv_f1']:>8.4f}±{result['cv_f1_std']:.3f}"
+              f"{result['fit_s']:>8.2f}{result['accuracy']:>10.4f}{result['f1']:>8.4f}"
+              f"{result['latency_ms']:>10.3f}{result['batch_us']:>14.1f}{result['size_kb']:>10.0f}")
+    print(f"  * cheapest to serve within {f1_tolerance:.3f} CV F1 of the best")
+    return chosen, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the text and URL fraud models")
+    parser.add_argument("--sms", default="sms_spam.csv", help="SMS Spam Collection CSV")
+    parser.add_argument("--urls", default="phishing_urls.csv", help="UCI Phishing Sites CSV")
+    parser.add_argument("--cache-dir", default=".train_cache", help="where preprocessed text is cached")
+    parser.add_argument("--cv", type=int, default=5, help="cross-validation folds")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores for preprocessing, CV and fitting")
+    parser.add_argument("--f1-tolerance", type=float, default=0.01,
+                        help="CV F1 a cheaper model may give up against the best one")
+    args = parser.parse_args(argv)
+
+    # Download required NLTK resources
+    import nltk
+    try:
+        nltk.download('stopwords', download_dir=config.NLTK_DATA_DIR, quiet=True)
+    except Exception as e:
+        sys.exit(f"Error downloading NLTK resources: {e}")
+
+    started = time.perf_counter()
+    sms_data, url_data = load_datasets(args.sms, args.urls)
+    # Same preprocessing as serving
+    sms_data['clean_text'] = cached_clean_text(sms_data['text'].tolist(), TextPreprocessor(), args.cache_dir, args.n_jobs)
+
+    X_train_text, X_test_text, y_train_text, y_test_text = train_test_split(
+        sms_data['clean_text'].tolist(), sms_data['label'], test_size=0.2, random_state=42, stratify=sms_data['label']
+    )
+    text_choice, text_results = search(
+        "Text", TEXT_CANDIDATES, X_train_text, y_train_text, X_test_text, y_test_text,
+        args.cv, args.n_jobs, args.f1_tolerance,
+    )
+
+    X_train_url, X_test_url, y_train_url, y_test_url = train_test_split(
+        url_data[URL_FEATURES], url_data['class'], test_size=0.2, random_state=42
+    )
+    url_choice, _ = search(
+        "URL", URL_CANDIDATES, X_train_url, y_train_url, X_test_url, y_test_url,
+        args.cv, args.n_jobs, args.f1_tolerance,
+    )
+
+    # Save the best model of each text format so either TEXT_MODEL_PATH works;
+    # the recommendation below is the chosen one
+    text_paths = {'pkl': 'text_fraud_model.pkl', 'npz': 'text_fraud_model.npz'}
+    for kind, path in text_paths.items():
+        candidates = [result for result in text_results if result['kind'] == kind]
+        if candidates:
+            best = text_choice if text_choice['kind'] == kind else max(candidates, key=lambda result: result['cv_f1'])
+            save_model(best['model'], kind, path)
+    save_model(url_choice['model'], 'pkl', 'url_fraud_model.pkl')
+
+    print(f"\nText model: {text_choice['label']} -> {text_paths[text_choice['kind']]}")
+    if os.path.basename(config.TEXT_MODEL_PATH) != text_paths[text_choice['kind']]:
+        print(f"  set TEXT_MODEL_PATH={text_paths[text_choice['kind']]} to serve it")
+    print(f"URL model: {url_choice['label']} -> url_fraud_model.pkl")
+    print(f"Models trained and saved successfully in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from typing import Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import config
+from models import User
+from utils.cache import LRUCache
+
+
+class UserRecord:
+    """Read-only snapshot of a users row; replaced, never mutated."""
+    __slots__ = ("id", "username", "phone", "password")
+
+    def __init__(self, id, username, phone, password):
+        self.id = id
+        self.username = username
+        self.phone = phone
+        self.password = password
+
+
+_COLUMNS = (User.id, User.username, User.phone, User.password)
+
+
+class UserDirectory:
+    """Bounded id/phone/username -> UserRecord maps, filled on demand.
+
+    Only hits are cached, so a new user is never hidden behind a cached
+    miss. Writers must call ``invalidate`` (or ``add`` for new rows); the
+    TTL bounds staleness for changes made by other processes.
+    """
+
+    def __init__(self, maxsize=100_000, ttl=None):
+        self._by_id = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._by_phone = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._by_username = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def add(self, record: UserRecord):
+        self._by_id.set(record.id, record)
+        self._by_phone.set(record.phone, record)
+        self._by_username.set(record.username, record)
+        return record
+
+    def invalidate(self, user_id=None, phone=None, username=None):
+        """Drop a user under every key it is cached by."""
+        records = (self._by_id.pop(user_id), self._by_phone.pop(phone), self._by_username.pop(username))
+        for record in records:
+            if record is not None:
+                self._by_id.pop(record.id)
+                self._by_phone.pop(record.phone)
+                self._by_username.pop(record.username)
+
+    def clear(self):
+        self._by_id.clear()
+        self._by_phone.clear()
+        self._by_username.clear()
+
+    async def _load(self, db: AsyncSession, column, values):
+        rows = await db.execute(select(*_COLUMNS).where(column.in_(values)))
+        return [self.add(UserRecord(*row)) for row in rows]
+
+    async def _get(self, db: AsyncSession, cache: LRUCache, column, key) -> Optional[UserRecord]:
+        if key is None:
+            return None
+        record = cache.get(key)
+        if record is None:
+            loaded = await self._load(db, column, [key])
+            record = loaded[0] if loaded else None
+        return record
+
+    async def by_id(self, db: AsyncSession, user_id: int) -> Optional[UserRecord]:
+        return await self._get(db, self._by_id, User.id, user_id)
+
+    async def by_phone(self, db: AsyncSession, phone: str) -> Optional[UserRecord]:
+        return await self._get(db, self._by_phone, User.phone, phone)
+
+    async def by_username(self, db: AsyncSession, username: str) -> Optional[UserRecord]:
+        return await self._get(db, self._by_username, User.username, username)
+
+    async def _many(self, db: AsyncSession, cache: LRUCache, column, keys: Iterable, key_of):
+        found = {}
+        missing = []
+        for key in set(keys):
+            record = cache.get(key)
+            if record is None:
+                missing.append(key)
+            else:
+                found[key] = record
+        # One IN query for everything not cached yet
+        if missing:
+            for record in await self._load(db, column, missing):
+                found[key_of(record)] = record
+        return found
+
+    async def many_by_id(self, db: AsyncSession, user_ids: Iterable[int]) -> dict:
+        return await self._many(db, self._by_id, User.id, user_ids, lambda record: record.id)
+
+    async def many_by_phone(self, db: AsyncSession, phones: Iterable[str]) -> dict:
+        return await self._many(db, self._by_phone, User.phone, phones, lambda record: record.phone)
+
+    def stats(self):
+        return {"id": self._by_id.stats(), "phone": self._by_phone.stats(), "username": self._by_username.stats()}
+
+
+directory = UserDirectory(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
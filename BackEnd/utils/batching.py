@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """Collect concurrent submissions into batches and run them on a worker pool.
+
+    ``fn`` receives a list of items and must return a list of results in the
+    same order. It runs in a thread, so it must not touch the event loop.
+    """
+
+    def __init__(self, fn, max_batch_size=32, max_wait=0.002, max_workers=2, name="batcher"):
+        self._fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._max_workers = max_workers
+        self._name = name
+        self._executor = None
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self._inflight = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=self._name)
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self._max_workers)
+            self._task = loop.create_task(self._collect())
+
+    async def submit(self, item):
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items):
+        if not items:
+            return []
+        self._ensure_started()
+        futures = []
+        for item in items:
+            future = self._loop.create_future()
+            self._queue.put_nowait((item, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self):
+        while True:
+            # Only start a batch when a worker is free, so items pile up
+            # into bigger batches while the pool is saturated.
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            if self.max_wait and self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            task = self._loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            items = [item for item, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(self._executor, self._fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,26 @@
+import logging
+import random
+
+
+class _Fields:
+    """Formats key=value pairs only if a handler actually emits the record."""
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                        for key, value in self.fields.items())
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sample_rate: float = 1.0, **fields):
+    """Log ``event key=value ...`` lazily, keeping only ``sample_rate`` of the records.
+
+    Disabled levels and dropped samples cost one check and no formatting.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    logger.log(level, "%s %s", event, _Fields(fields))
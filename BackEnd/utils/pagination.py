@@ -0,0 +1,69 @@
+import base64
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp: datetime, id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raise ValueError when the cursor was not produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def encode_rank_cursor(rank: float, id: int) -> str:
+    raw = f"{rank!r}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    """Raise ValueError when the cursor was not produced by encode_rank_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return float(rank), int(id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def keyset_filter(query, timestamp_col, id_col, before=None, after=None, since=None):
+    """Restrict and order a query by (timestamp, id).
+
+    ``before`` pages backwards (newest first); ``after`` and ``since`` page
+    forwards (oldest first) so polling clients can keep following the last
+    cursor they received.
+    """
+    if before is not None:
+        ts, id = decode_cursor(before)
+        # The leading ts <= bound lets the (…, timestamp, id) index drive the range scan
+        query = query.filter(timestamp_col <= ts, or_(timestamp_col < ts, and_(timestamp_col == ts, id_col < id)))
+        return query.order_by(timestamp_col.desc(), id_col.desc())
+    if after is not None:
+        ts, id = decode_cursor(after)
+        query = query.filter(timestamp_col >= ts, or_(timestamp_col > ts, and_(timestamp_col == ts, id_col > id)))
+        return query.order_by(timestamp_col.asc(), id_col.asc())
+    if since is not None:
+        # Timestamps are stored as naive UTC
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.filter(timestamp_col > since)
+        return query.order_by(timestamp_col.asc(), id_col.asc())
+    return query.order_by(timestamp_col.desc(), id_col.desc())
+
+
+def set_page_headers(response, rows, limit, timestamp_attr="timestamp"):
+    """Expose the continuation cursor of a page fetched with limit + 1 rows."""
+    has_more = len(rows) > limit
+    page = rows[:limit]
+    if page:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, timestamp_attr), last.id)
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    return page
@@ -1,16 +1,54 @@
+import asyncio
 import bcrypt
 import jwt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import config
+
+# bcrypt releases the GIL, so a small dedicated pool hashes in parallel
+# without blocking the event loop or starving the default executor.
+_bcrypt_executor = ThreadPoolExecutor(max_workers=config.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when more than BCRYPT_MAX_PENDING hashing jobs are queued."""
+
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def needs_rehash(hashed_password: str) -> bool:
+    """True when the hash was made with a different cost factor than configured."""
+    try:
+        return int(hashed_password.split('$')[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def _run_bounded(fn, *args):
+    # Only touched from the event loop thread, so a plain counter is enough
+    global _pending
+    if _pending >= config.BCRYPT_MAX_PENDING:
+        raise PasswordHasherBusy()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bounded(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bounded(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=1)
+    expire = datetime.utcnow() + timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, "secret_key", algorithm="HS256")
-    return encoded_jwt
\ No newline at end of file
+    encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.JWT_ALGORITHM)
+    return encoded_jwt
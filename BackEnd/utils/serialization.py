@@ -0,0 +1,29 @@
+import json
+from datetime import date, datetime
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder produces the same JSON
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    """Compact JSON as bytes; datetimes become ISO 8601 like pydantic emits."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response for already-shaped dicts and lists: no validation pass."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)